@@ -3,11 +3,23 @@
 __all__ = ["index", "modules", "custom_doc_links", "git_url"]
 
 index = {"DataChunk": "00_core.ipynb",
+         "LazyDataChunk": "00_core.ipynb",
+         "SparseDataChunk": "00_core.ipynb",
+         "RLEDataChunk": "00_core.ipynb",
+         "COMPACT_DTYPE_POLICY": "00_core.ipynb",
+         "content_hash": "00_core.ipynb",
+         "IntervalIndex": "00_core.ipynb",
          "ContiguousRecord": "00_core.ipynb",
          "RecordMaster": "00_core.ipynb",
          "Data_Pipe": "00_core.ipynb",
+         "PrefetchIterator": "00_core.ipynb",
          "export_record": "00_core.ipynb",
          "import_record": "00_core.ipynb",
+         "export_datachunk": "00_core.ipynb",
+         "export_record_dir": "00_core.ipynb",
+         "import_record_dir": "00_core.ipynb",
+         "convert_record": "00_core.ipynb",
+         "export_subset": "00_core.ipynb",
          "extend_sync_timepoints": "01_utils.ipynb",
          "align_sync_timepoints": "01_utils.ipynb",
          "resample_to_timepoints": "01_utils.ipynb",
@@ -123,6 +135,12 @@ index = {"DataChunk": "00_core.ipynb",
          "split_eye_events": "06_eyetrack.ipynb",
          "get_spherical_map": "06_eyetrack.ipynb",
          "apply_spherical_map": "06_eyetrack.ipynb",
+         "input_hash": "07_memoize.ipynb",
+         "ResultCache": "07_memoize.ipynb",
+         "RecordCatalog": "08_catalog.ipynb",
+         "run_batch": "09_parallel.ipynb",
+         "SharedDataChunk": "09_parallel.ipynb",
+         "SharedRecord": "09_parallel.ipynb",
          "atoi": "10_synchro.io.ipynb",
          "natural_keys": "10_synchro.io.ipynb",
          "filter_per_extension": "10_synchro.io.ipynb",
@@ -202,6 +220,9 @@ modules = ["core.py",
            "plotting.py",
            "database.py",
            "eyetrack.py",
+           "memoize.py",
+           "catalog.py",
+           "parallel.py",
            "synchro/io.py",
            "synchro/extracting.py",
            "synchro/processing.py",
@@ -0,0 +1,178 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: 08_catalog.ipynb (unless otherwise specified).
+
+__all__ = ['RecordCatalog']
+
+# Cell
+import os, glob, json, sqlite3
+import h5py
+import numpy as np
+import pandas as pd
+
+# Cell
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, n_sequences INTEGER,
+                                  error TEXT);
+CREATE TABLE IF NOT EXISTS sequences (path TEXT, sequence INTEGER, length INTEGER, frame_rate REAL);
+CREATE TABLE IF NOT EXISTS streams (path TEXT, sequence INTEGER, name TEXT, grp TEXT, idx INTEGER, length INTEGER,
+                                    shape TEXT, dtype TEXT, md5 TEXT, stim_name TEXT, n_repeat INTEGER, attrs TEXT);
+CREATE INDEX IF NOT EXISTS sequences_path ON sequences (path);
+CREATE INDEX IF NOT EXISTS streams_path ON streams (path);
+CREATE INDEX IF NOT EXISTS streams_name ON streams (name);
+CREATE INDEX IF NOT EXISTS streams_md5 ON streams (md5);
+"""
+
+def _h5_scalar_attrs(h5_obj) -> dict:
+    """Returns the json attributes of a DataChunk saved by export_record that are numbers or strings"""
+    attrs = {}
+    for key, value in h5_obj.attrs.items():
+        if key.startswith("__"):
+            continue
+        try:
+            value = json.loads(value)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(value, (int, float, str, bool)):
+            attrs[key] = value
+    return attrs
+
+def _h5_datachunk_meta(h5_obj) -> tuple:
+    """Returns the shape and dtype of a DataChunk saved by export_record, reading only the repeats of run-length
+    encoded DataChunk"""
+    if h5_obj.attrs.get("__sparse") is not None:
+        return tuple(int(dim) for dim in h5_obj.attrs["__shape"]), h5_obj["data"].dtype
+    if h5_obj.attrs.get("__rle") is not None:
+        frames = h5_obj["frames"]
+        return (int(np.sum(h5_obj["repeats"][:])), *frames.shape[1:]), frames.dtype
+    return tuple(h5_obj.shape), h5_obj.dtype
+
+def _scan_record(path:str) -> tuple:
+    """Returns the rows of the sequences and streams tables of a record_master.h5 file"""
+    seq_rows, stream_rows = [], []
+    with h5py.File(path, mode="r") as h5_f:
+        for key_contig in sorted(h5_f.keys(), key=int):
+            ref_contig = h5_f[key_contig]
+            frame_time = ref_contig.attrs.get("_frame_time", h5_f.attrs.get("_frame_time"))
+            seq_rows.append((path, int(key_contig), int(ref_contig.attrs["length"]),
+                             None if frame_time is None else round(1/float(frame_time), 6)))
+            for name, ref_dstream in ref_contig.items():
+                for key_dc, h5_dc in ref_dstream.items():
+                    if key_dc.startswith("__ndarray_"):
+                        continue
+                    shape, dtype = _h5_datachunk_meta(h5_dc)
+                    attrs = _h5_scalar_attrs(h5_dc)
+                    group = h5_dc.attrs.get("__group")
+                    stream_rows.append((path, int(key_contig), name, None if group is None else str(group),
+                                        int(key_dc), shape[0], json.dumps(shape), np.dtype(dtype).str,
+                                        attrs.pop("md5", None), attrs.pop("name", None), attrs.pop("n_repeat", None),
+                                        json.dumps(attrs)))
+    return seq_rows, stream_rows
+
+# Cell
+class RecordCatalog():
+    """Catalog of the content of record_master.h5 files stored in a SQLite file, to find the records
+    containing some data without opening them with import_record.
+
+    Usage:
+        with RecordCatalog("~/records/catalog.sqlite") as catalog:
+            catalog.update("~/records")
+            paths = catalog.find(["chirp_am", "S_matrix"], min_length={"S_matrix": 100000})
+
+    params:
+        - catalog_path: Path of the SQLite file of the catalog, created if needed
+    """
+    def __init__(self, catalog_path:str):
+        self.catalog_path = os.path.expanduser(catalog_path)
+        self._conn = sqlite3.connect(self.catalog_path)
+        self._conn.executescript(_CATALOG_SCHEMA)
+
+    def _remove(self, path:str):
+        for table in ["files", "sequences", "streams"]:
+            self._conn.execute("DELETE FROM %s WHERE path=?" % table, (path,))
+
+    def update(self, root_dir:str, pattern:str="**/*.h5") -> dict:
+        """Scan the record_master.h5 files matching pattern in root_dir, only reading again the files whose
+        mtime or size changed since the last update. Files of root_dir that were deleted are removed from the
+        catalog, and files that cannot be read are listed with their error in the files table.
+
+        params:
+            - root_dir: Directory scanned
+            - pattern: Glob pattern of the files, relative to root_dir
+
+        return:
+            - dict of the number of files "scanned", "unchanged" and "removed"
+        """
+        root_dir = os.path.abspath(os.path.expanduser(root_dir))
+        known    = {path: (mtime, size) for path, mtime, size
+                    in self._conn.execute("SELECT path, mtime, size FROM files")}
+        paths    = sorted(os.path.abspath(path) for path in glob.glob(os.path.join(root_dir, pattern), recursive=True)
+                          if os.path.abspath(path) != os.path.abspath(self.catalog_path))
+        counts   = {"scanned": 0, "unchanged": 0, "removed": 0}
+        with self._conn:
+            for path in paths:
+                stat = os.stat(path)
+                if known.get(path) == (stat.st_mtime, stat.st_size):
+                    counts["unchanged"] += 1
+                    continue
+                self._remove(path)
+                try:
+                    seq_rows, stream_rows = _scan_record(path)
+                    error = None
+                except Exception as e: #Not a record_master file, or a file being written
+                    seq_rows, stream_rows, error = [], [], "%s: %s" % (type(e).__name__, e)
+                self._conn.executemany("INSERT INTO sequences VALUES (?,?,?,?)", seq_rows)
+                self._conn.executemany("INSERT INTO streams VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", stream_rows)
+                self._conn.execute("INSERT INTO files VALUES (?,?,?,?,?)",
+                                   (path, stat.st_mtime, stat.st_size, len(seq_rows), error))
+                counts["scanned"] += 1
+            paths = set(paths)
+            for path in known.keys():
+                if path.startswith(root_dir + os.sep) and path not in paths:
+                    self._remove(path)
+                    counts["removed"] += 1
+        return counts
+
+    def query(self, sql:str, params:tuple=()) -> pd.DataFrame:
+        """Returns the result of a SQL query on the catalog tables as a DataFrame, e.g.
+        catalog.query("SELECT DISTINCT path FROM streams WHERE md5=?", (md5,))"""
+        return pd.read_sql_query(sql, self._conn, params=params)
+
+    def find(self, names, min_length=None) -> pd.DataFrame:
+        """Returns the path and sequence of the sequences containing all the names.
+
+        params:
+            - names: Name, or list of names that the sequences must contain
+            - min_length: Minimum length (summed over its DataChunk) of each name in a sequence, or dict of the
+            minimum length of some of the names.
+        """
+        if isinstance(names, str):
+            names = [names]
+        if not isinstance(min_length, dict):
+            min_length = {name: min_length or 0 for name in names}
+        min_length = {name: length for name, length in min_length.items() if name in names}
+        #A CASE without WHEN clause is a syntax error
+        length_sql = "CASE name %s ELSE 0 END" % " ".join("WHEN ? THEN ?" for _ in min_length) if min_length else "0"
+        sql = ("SELECT path, sequence FROM ("
+               "  SELECT path, sequence, name, SUM(length) AS length FROM streams"
+               "  WHERE name IN (%s) GROUP BY path, sequence, name)"
+               " WHERE length >= %s"
+               " GROUP BY path, sequence HAVING COUNT(*) = ? ORDER BY path, sequence"
+               % (",".join("?"*len(names)), length_sql))
+        params = list(names) + [val for item in min_length.items() for val in item] + [len(names)]
+        return self.query(sql, tuple(params))
+
+    @property
+    def files(self) -> pd.DataFrame:
+        return self.query("SELECT * FROM files ORDER BY path")
+
+    @property
+    def streams(self) -> pd.DataFrame:
+        return self.query("SELECT * FROM streams ORDER BY path, sequence, name, idx")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
\ No newline at end of file
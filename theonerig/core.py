@@ -1,12 +1,20 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: 00_core.ipynb (unless otherwise specified).
 
-__all__ = ['DataChunk', 'ContiguousRecord', 'RecordMaster', 'Data_Pipe', 'export_record', 'import_record']
+__all__ = ['DataChunk', 'LazyDataChunk', 'SparseDataChunk', 'RLEDataChunk', 'COMPACT_DTYPE_POLICY', 'content_hash',
+           'IntervalIndex', 'ContiguousRecord', 'RecordMaster', 'Data_Pipe', 'PrefetchIterator', 'export_record',
+           'import_record', 'export_datachunk', 'export_record_dir', 'import_record_dir', 'convert_record',
+           'export_subset']
 
 # Cell
 import h5py
-import json, re
+import json, re, os, shutil
+import bisect, zlib, time, threading, hashlib, weakref
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from collections import namedtuple
+import pandas as pd
+from scipy import sparse
+from collections import namedtuple, deque, OrderedDict
 from typing import Dict, Tuple, Sequence, Union
 import itertools
 import matplotlib.pyplot as plt
@@ -56,6 +64,453 @@ class DataChunk(np.ndarray):
     def __repr__(self):
         return "DataChunk(%s,%s,%s,%s)"%(self.shape, self.idx, self.group, self.fill)
 
+# Cell
+class LazyDataChunk():
+    """DataChunk whose data stays in its source (e.g. an h5py Dataset) and is only read for the
+    windows requested. It carries the same metadata as a DataChunk, and is materialised into a
+    numpy array with np.array(lazy_dc) or into a DataChunk with lazy_dc.load().
+    params:
+        - source: Array-like of shape (time, ...) supporting slicing, with a shape and a dtype.
+        - idx: Index of the start of the DataChunk in the record.
+        - group: group of the DataChunk in {stim, sync, cell, data}
+        - fill: Default filling value.
+        - attrs_loader: Optional function returning the attrs dictionnary, called on first access."""
+    def __init__(self, source, idx, group, fill=0, attrs_loader=None):
+        self.source = source
+        self.idx    = idx
+        self.group  = group
+        self.fill   = fill
+
+        self._attrs        = None if attrs_loader is not None else {}
+        self._attrs_loader = attrs_loader
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = self._attrs_loader()
+            cached = getattr(self, "_content_hash", None)
+            if cached is not None and cached[0][-1] is None: #The hash was cached for the attrs just loaded
+                self._content_hash = (_hash_key(self),) + cached[1:]
+        return self._attrs
+
+    @attrs.setter
+    def attrs(self, value):
+        self._attrs = value
+
+    @property
+    def shape(self):
+        return tuple(self.source.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.source.dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def range(self):
+        return range(self.idx, self.idx + len(self))
+
+    @property
+    def slice(self):
+        return slice(self.idx, self.idx + len(self))
+
+    def read(self, start:int, stop:int) -> np.ndarray:
+        """Read the data between start and stop, relative to the beginning of this DataChunk"""
+        return np.asarray(self.source[start:stop])
+
+    def load(self) -> DataChunk:
+        """Read the whole data and returns it as a DataChunk"""
+        datachunk = DataChunk(self.read(0, len(self)), self.idx, self.group, self.fill)
+        datachunk.attrs = self.attrs
+        return datachunk
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            return self.read(start, max(start, stop))
+        return np.asarray(self.source[key])
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read(0, len(self))
+        return data if dtype is None else data.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "LazyDataChunk(%s,%s,%s,%s)"%(self.shape, self.idx, self.group, self.fill)
+
+def _memmap_base(array):
+    """Returns the np.memmap holding the data of array, or None if it is not memory mapped"""
+    base = array
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return base
+        base = getattr(base, "base", None)
+    return None
+
+
+# Cell
+class SparseDataChunk(LazyDataChunk):
+    """DataChunk of mostly null data of shape (time, n), like spike counts, stored as a scipy.sparse
+    CSR matrix. Windows along time are read without densifying with read_sparse (or with
+    ContiguousRecord.fetch_sparse), while reading it as a DataChunk (through a ContiguousRecord,
+    np.array or load) returns dense data. The fill value is always 0.
+    params:
+        - data: scipy.sparse matrix or ndarray of shape (time, n)
+        - idx: Index of the start of the DataChunk in the record.
+        - group: group of the DataChunk in {stim, sync, cell, data}
+        - attrs_loader: Optional function returning the attrs dictionnary, called on first access."""
+    def __init__(self, data, idx, group, attrs_loader=None):
+        if np.ndim(data) != 2 and not sparse.issparse(data):
+            raise ValueError("SparseDataChunk data must be of shape (time, n), not %s" % (np.shape(data),))
+        super().__init__(sparse.csr_matrix(data), idx, group, fill=0, attrs_loader=attrs_loader)
+
+    @classmethod
+    def from_datachunk(cls, datachunk:DataChunk):
+        """Returns the SparseDataChunk of a DataChunk of shape (time, n) and fill value 0"""
+        if datachunk.fill != 0:
+            raise ValueError("Only DataChunk with a fill value of 0 can be made sparse")
+        sparse_dc = cls(np.asarray(datachunk), datachunk.idx, datachunk.group)
+        sparse_dc.attrs = dict(datachunk.attrs)
+        return sparse_dc
+
+    @property
+    def nbytes(self):
+        return self.source.data.nbytes + self.source.indices.nbytes + self.source.indptr.nbytes
+
+    def read(self, start:int, stop:int) -> np.ndarray:
+        """Read the dense data between start and stop, relative to the beginning of this DataChunk"""
+        return self.source[start:stop].toarray()
+
+    def read_sparse(self, start:int, stop:int):
+        """Read the data between start and stop as a CSR matrix, relative to the beginning of this DataChunk"""
+        return self.source[start:stop]
+
+    def tocsr(self):
+        """Returns the CSR matrix of the data"""
+        return self.source
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            return super().__getitem__(key)
+        return self.read(0, len(self))[key]
+
+    def __repr__(self):
+        return "SparseDataChunk(%s,%s,%s,nnz=%s)"%(self.shape, self.idx, self.group, self.source.nnz)
+
+# Cell
+class RLEDataChunk(LazyDataChunk):
+    """DataChunk of run-length encoded data, like stimuli made of frames repeated on the screen, stored as
+    its unique frames and their number of repeats. Only the windows requested are expanded, while reading
+    it as a DataChunk (through a ContiguousRecord, np.array or load) returns the expanded data.
+    params:
+        - frames: Array-like of the frames of shape (n_run, ...) supporting slicing (ndarray or h5py Dataset)
+        - repeats: Number of repeats of each frame, of shape (n_run,)
+        - idx: Index of the start of the DataChunk in the record.
+        - group: group of the DataChunk in {stim, sync, cell, data}
+        - fill: Default filling value.
+        - attrs_loader: Optional function returning the attrs dictionnary, called on first access."""
+    def __init__(self, frames, repeats, idx, group, fill=0, attrs_loader=None):
+        super().__init__(frames, idx, group, fill=fill, attrs_loader=attrs_loader)
+        self.repeats = np.asarray(repeats, dtype=np.int64)
+        if len(self.repeats) != len(frames):
+            raise ValueError("%d repeats given for %d frames" % (len(self.repeats), len(frames)))
+        self._run_stops  = np.cumsum(self.repeats)
+        self._run_starts = self._run_stops - self.repeats
+
+    @classmethod
+    def from_datachunk(cls, datachunk:DataChunk):
+        """Returns the RLEDataChunk of a DataChunk, with a run for each sequence of identical frames"""
+        data = np.asarray(datachunk)
+        changes    = np.any((data[1:] != data[:-1]).reshape(max(len(data)-1, 0), -1), axis=1)
+        run_starts = np.concatenate(([0], np.nonzero(changes)[0]+1)) if len(data) else np.zeros(0, dtype=int)
+        repeats    = np.diff(np.append(run_starts, len(data)))
+        rle_dc = cls(data[run_starts], repeats, datachunk.idx, datachunk.group, datachunk.fill)
+        rle_dc.attrs = dict(datachunk.attrs)
+        return rle_dc
+
+    @property
+    def frames(self):
+        return self.source
+
+    @property
+    def shape(self):
+        return (int(self._run_stops[-1]) if len(self.repeats) else 0, *self.source.shape[1:])
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.source.shape)) * self.dtype.itemsize + self.repeats.nbytes
+
+    def read(self, start:int, stop:int) -> np.ndarray:
+        """Expand the data between start and stop, relative to the beginning of this DataChunk"""
+        stop = max(start, min(stop, len(self)))
+        if stop == start:
+            return np.empty((0, *self.shape[1:]), dtype=self.dtype)
+        first = np.searchsorted(self._run_stops, start, side="right")
+        last  = np.searchsorted(self._run_stops, stop-1, side="right")
+        counts = (np.minimum(self._run_stops[first:last+1], stop)
+                  - np.maximum(self._run_starts[first:last+1], start))
+        return np.repeat(np.asarray(self.source[first:last+1]), counts, axis=0)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            return super().__getitem__(key)
+        return self.read(0, len(self))[key]
+
+    def __repr__(self):
+        return "RLEDataChunk(%s,%s,%s,%s,n_run=%s)"%(self.shape, self.idx, self.group, self.fill, len(self.repeats))
+
+# Cell
+COMPACT_DTYPE_POLICY = {"stim": ["uint8", "int8", "int16", "float32"],
+                        "sync": ["int32", "int64", "float32"],
+                        "cell": ["uint16", "float32"],
+                        "data": ["uint16", "float32"]}
+
+def _lossless_cast(array, dtype) -> bool:
+    """Check if array can be cast to dtype and back without loss"""
+    with np.errstate(invalid="ignore", over="ignore"):
+        return np.array_equal(array.astype(dtype), array, equal_nan=dtype.kind=="f")
+
+def _compact_dtype(array, candidates:list, fill=None, block_len:int=None) -> np.dtype:
+    """Returns the first dtype of candidates, not larger than the dtype of array, to which array and fill can be
+    cast without loss. Returns the dtype of array if there is none. If block_len is given, array is read by blocks
+    of block_len timepoints, so memory mapped or lazy data is never loaded whole."""
+    dtype = np.dtype(array.dtype)
+    if dtype.kind not in "iuf":
+        return dtype
+    remaining = []
+    for candidate in map(np.dtype, candidates):
+        if candidate == dtype:
+            break
+        if candidate.itemsize > dtype.itemsize:
+            continue
+        if fill is None or _lossless_cast(np.asarray(fill), candidate):
+            remaining.append(candidate)
+    blocks = [np.asarray(array)] if block_len is None else (array[start:start+block_len]
+                                                            for start in range(0, len(array), block_len))
+    for block in blocks:
+        if len(remaining) == 0:
+            break
+        block     = np.asarray(block)
+        remaining = [candidate for candidate in remaining if _lossless_cast(block, candidate)]
+    return remaining[0] if len(remaining) else dtype
+
+class _CastSource():
+    """Array-like casting to dtype the data read from source, to write a lazy or memory mapped DataChunk
+    with a dtype policy without loading it."""
+    def __init__(self, source, dtype):
+        self.source = source
+        self._dtype = np.dtype(dtype)
+
+    @property
+    def shape(self):
+        return tuple(self.source.shape)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def __getitem__(self, key):
+        return np.asarray(self.source[key]).astype(self._dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+def _policy_candidates(dtype_policy:dict, name:str, group:str) -> list:
+    """Returns the candidate dtypes of a dtype policy for a name, or else for its group"""
+    if dtype_policy is None:
+        return None
+    return dtype_policy.get(name, dtype_policy.get(group))
+
+def _apply_dtype_policy(datachunk, candidates:list, cast_lazy:bool=False):
+    """Returns the datachunk cast to the first lossless dtype of candidates, or datachunk itself if the dtype
+    is unchanged. Lazy and memory mapped DataChunk are returned unchanged, as casting would load them, unless
+    cast_lazy is True (at export): they are then checked by blocks, and returned as a LazyDataChunk casting the
+    blocks read."""
+    if not candidates:
+        return datachunk
+    if isinstance(datachunk, SparseDataChunk):
+        dtype = _compact_dtype(datachunk.tocsr().data, candidates, datachunk.fill)
+        if dtype == datachunk.dtype:
+            return datachunk
+        res = SparseDataChunk(datachunk.tocsr().astype(dtype), datachunk.idx, datachunk.group)
+    elif isinstance(datachunk, RLEDataChunk):
+        frames = datachunk.frames
+        if not isinstance(frames, np.ndarray) and not cast_lazy:
+            return datachunk
+        dtype = _compact_dtype(frames, candidates, datachunk.fill, _block_len(frames))
+        if dtype == datachunk.dtype:
+            return datachunk
+        frames = frames.astype(dtype) if isinstance(frames, np.ndarray) else _CastSource(frames, dtype)
+        res = RLEDataChunk(frames, datachunk.repeats, datachunk.idx, datachunk.group, datachunk.fill)
+    elif isinstance(datachunk, LazyDataChunk) or _memmap_base(datachunk) is not None:
+        if not cast_lazy:
+            return datachunk
+        dtype = _compact_dtype(datachunk, candidates, datachunk.fill, _block_len(datachunk))
+        if dtype == datachunk.dtype:
+            return datachunk
+        res = LazyDataChunk(_CastSource(datachunk, dtype), datachunk.idx, datachunk.group, datachunk.fill)
+    else:
+        dtype = _compact_dtype(datachunk, candidates, datachunk.fill)
+        if dtype == datachunk.dtype:
+            return datachunk
+        res = DataChunk(np.asarray(datachunk).astype(dtype), datachunk.idx, datachunk.group, datachunk.fill)
+    res.attrs = datachunk.attrs
+    return res
+
+def _block_len(array, block_bytes:int=2**24) -> int:
+    """Returns the number of timepoints of array read at once to hold about block_bytes"""
+    row_bytes = max(1, int(np.prod(array.shape[1:])) * np.dtype(array.dtype).itemsize)
+    return max(1, block_bytes // row_bytes)
+
+# Cell
+def _update_attrs_hash(hasher, attrs:dict):
+    for key in sorted(attrs.keys()):
+        value = attrs[key]
+        hasher.update(key.encode())
+        if isinstance(value, np.ndarray):
+            hasher.update((value.dtype.str + str(value.shape)).encode())
+            hasher.update(np.ascontiguousarray(value))
+        else:
+            hasher.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+def _hash_meta(datachunk) -> tuple:
+    """Metadata hashed with the data of a DataChunk"""
+    return (datachunk.group, json.dumps(np.asarray(datachunk.fill).item()), tuple(datachunk.shape), datachunk.dtype.str)
+
+def _hash_key(datachunk) -> tuple:
+    """Metadata and digest of the attrs of a DataChunk, to check that a cached hash is still valid. The attrs of
+    a LazyDataChunk not loaded yet are those stored in its file, and are not read (None instead of their digest)"""
+    if isinstance(datachunk, LazyDataChunk) and datachunk._attrs is None:
+        return _hash_meta(datachunk) + (None,)
+    hasher = hashlib.blake2b(digest_size=16)
+    _update_attrs_hash(hasher, datachunk.attrs)
+    return _hash_meta(datachunk) + (hasher.hexdigest(),)
+
+def _hash_content(datachunk, chunk_bytes:int) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(json.dumps(_hash_meta(datachunk)).encode())
+    _update_attrs_hash(hasher, datachunk.attrs)
+    row_bytes = max(1, int(np.prod(datachunk.shape[1:])) * datachunk.dtype.itemsize)
+    step      = max(1, chunk_bytes // row_bytes)
+    for start in range(0, len(datachunk), step):
+        if isinstance(datachunk, LazyDataChunk):
+            block = datachunk.read(start, start+step)
+        else:
+            block = np.asarray(datachunk[start:start+step])
+        hasher.update(np.ascontiguousarray(block))
+    return hasher.hexdigest()
+
+def _is_writeable(datachunk) -> bool:
+    """Check if the data of a DataChunk can be modified in place (in memory or memory mapped in r+ mode)"""
+    return isinstance(datachunk, np.ndarray) and datachunk.flags.writeable
+
+def content_hash(datachunk, include_idx:bool=True, refresh:bool=False, chunk_bytes:int=2**24, pin:bool=False) -> str:
+    """Returns a blake2b hash of the content of a DataChunk (or LazyDataChunk): its data, dtype, shape, group,
+    fill, attrs and idx. DataChunk holding the same values have the same hash whatever their storage (in memory,
+    memory mapped, lazy, sparse or run-length encoded), so it can be used as a key to memoise analyses.
+
+    params:
+        - datachunk: The DataChunk to hash
+        - include_idx: If False, the position of the DataChunk in the record is not hashed (e.g. to find
+        identical stimuli in different records)
+        - refresh: Recompute the hash.
+        - chunk_bytes: Bytes of data read at once, to hash memory mapped or lazy data with bounded memory
+        - pin: Keep the hash cached even if the data is writeable. A pinned hash must then be refreshed after
+        modifying the data in place (done by ContiguousRecord.mark_dirty).
+
+    The hash is cached on the DataChunk, and is recomputed when its metadata or attrs change. The cache is only
+    reused for data that cannot be modified in place (read-only memory maps, lazy, sparse or run-length encoded
+    DataChunk), or when the hash is pinned (like the hashes stored in the file by export_record, at import).
+
+    return:
+        - The hash as an hexadecimal string
+    """
+    cached = getattr(datachunk, "_content_hash", None)
+    if (refresh or cached is None or cached[0] != _hash_key(datachunk)
+        or (_is_writeable(datachunk) and not cached[2] and not pin)):
+        digest = _hash_content(datachunk, chunk_bytes) #Loads the attrs of a LazyDataChunk before keying them
+        cached = (_hash_key(datachunk), digest, pin)
+    elif pin:
+        cached = (cached[0], cached[1], True)
+    datachunk._content_hash = cached
+    if not include_idx:
+        return cached[1]
+    return hashlib.blake2b((cached[1]+":"+str(int(datachunk.idx))).encode(), digest_size=16).hexdigest()
+
+def _seed_hash(datachunk, file_hash:str):
+    """Cache on an imported DataChunk the hash computed at its export. Only done for read-only data, as
+    writeable data can be modified in place before it is hashed (or exported again)."""
+    if not _is_writeable(datachunk):
+        datachunk._content_hash = (_hash_key(datachunk), file_hash, True)
+
+# Cell
+class IntervalIndex():
+    """Sorted index of the [start, stop) intervals covered by the DataChunks stored under a
+    same name. The intervals of a name cannot overlap, so the starts and the stops are both
+    sorted, and overlap checks or window queries are done by bisection in O(log n) instead of
+    comparing against every existing DataChunk.
+
+    Empty intervals never intersect anything, and are kept aside from the bisection lists."""
+    def __init__(self):
+        self._starts = []
+        self._stops  = []
+        self._items  = []
+        self._empty  = []
+
+    def overlaps(self, start:int, stop:int) -> bool:
+        """Check if the interval [start, stop) intersects an interval of the index"""
+        if stop <= start:
+            return False
+        pos = bisect.bisect_right(self._starts, start)
+        if pos > 0 and self._stops[pos-1] > start:
+            return True
+        return pos < len(self._starts) and self._starts[pos] < stop
+
+    def insert(self, start:int, stop:int, item=None):
+        """Insert the interval [start, stop) associated to item (usually the DataChunk)"""
+        if stop <= start:
+            self._empty.append((start, stop, item))
+            return
+        if self.overlaps(start, stop):
+            raise ValueError("The interval [%d, %d) intersects an existing interval" % (start, stop))
+        pos = bisect.bisect_right(self._starts, start)
+        self._starts.insert(pos, start)
+        self._stops.insert(pos, stop)
+        self._items.insert(pos, item)
+
+    def query(self, start:int, stop:int) -> list:
+        """Returns the items whose interval intersects [start, stop), sorted by start"""
+        if stop <= start:
+            return []
+        lo = bisect.bisect_right(self._starts, start) - 1
+        if lo < 0 or self._stops[lo] <= start:
+            lo += 1
+        hi = bisect.bisect_left(self._starts, stop)
+        return self._items[lo:hi]
+
+    def slices(self) -> list:
+        """Returns the slices of all the intervals, sorted by start"""
+        intervals = sorted(list(zip(self._starts, self._stops)) + [(s, e) for s, e, _ in self._empty])
+        return [slice(start, stop) for start, stop in intervals]
+
+    def __len__(self):
+        return len(self._items) + len(self._empty)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._stops, self._items))
+
+    def __repr__(self):
+        return "IntervalIndex(%s)" % list(zip(self._starts, self._stops))
+
 # Cell
 class ContiguousRecord():
     """Representation of a contiguous recording session to store DataChunk
@@ -69,6 +524,16 @@ class ContiguousRecord():
     one for timepoints of these signals for the main device and are called
     respectively "signals" and "main_tp".
 
+    When view_mode is True, getting a name whose window is covered by a single DataChunk
+    returns a view into that DataChunk instead of a filled copy (or only reads that window
+    for a LazyDataChunk). The path taken by the last access ("view", "read", "copy" or "cache") is
+    stored in last_access.
+
+    An optional LRU cache of the assembled windows, bounded in bytes, can be enabled with set_cache.
+    The cached DataChunk are read-only and shared between the calls, and the entries of a name are
+    invalidated when it is set or deleted (or marked dirty after an in place modification).
+
+    An optional dtype policy (see set_dtype_policy) casts the DataChunk set to compact dtypes.
     """
     MAIN_TP = "main_tp"
     SIGNALS = "signals"
@@ -84,31 +549,51 @@ class ContiguousRecord():
         self.length = length
         self._frame_time = 1/frame_rate
         self._data_dict = {}
+        self._index_dict = {}
+        self._unloaded   = {} #Names and groups of the data left in the file by a selective import
+        self._dirty      = {} #Names and idx of the DataChunk modified since the last export or import
+        self._deleted    = set() #Names deleted since the last export or import
+        self._cache      = OrderedDict() #(name, start, stop) -> DataChunk, in least recently used order
+        self._cache_lock = threading.Lock()
+        self._cache_max_bytes = 0
+        self._cache_nbytes    = 0
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.dtype_policy = None
 
         self[self.SIGNALS] = signals
         self[self.MAIN_TP] = main_tp
 
         self._slice = slice(0,self.length,1)
+        self.view_mode   = False
+        self.last_access = None
 
     def dataset_intersect(self, existing_datachunk:list, new_datachunk:DataChunk):
         """Check for timepoint intersections of two DataChunks"""
-        range_new = set(new_datachunk.range)
-        intersect = False
-        for range_existing in existing_datachunk:
-            intersect |= len(range_new.intersection(range_existing.range)) > 0
-        return intersect
+        start, stop = new_datachunk.idx, new_datachunk.idx + len(new_datachunk)
+        return any(max(start, dc.idx) < min(stop, dc.idx + len(dc)) for dc in existing_datachunk)
 
     def keys(self):
         """Retrieves the existing keyys inside this ContiguousRecord"""
         return self._data_dict.keys()
 
+    def available_keys(self) -> list:
+        """Retrieves the keys inside this ContiguousRecord, including the ones not loaded by import_record"""
+        return list(self._data_dict.keys()) + list(self._unloaded.keys())
+
     def get_slice(self, datachunk_name:str) -> list:
         """Returns the slices of the DataChunk corresponding to the given key"""
-        if datachunk_name in self._data_dict.keys():
-            return [chunk.slice for chunk in self._data_dict[datachunk_name]]
+        if datachunk_name in self._index_dict.keys():
+            return self._index_dict[datachunk_name].slices()
         else:
             return []
 
+    def get_index(self, datachunk_name:str) -> IntervalIndex:
+        """Returns the IntervalIndex of the DataChunk corresponding to the given key"""
+        if datachunk_name in self._index_dict.keys():
+            return self._index_dict[datachunk_name]
+        else:
+            return IntervalIndex()
+
     def set_slice(self, slice_):
         """Set the slice to restrict the size of the DataChunk returned"""
         if slice_ is None:
@@ -128,6 +613,124 @@ class ContiguousRecord():
                 self._slice = slice(start,stop,step)
 
 
+    def set_cache(self, max_bytes:int):
+        """Set the maximum bytes of the LRU cache of assembled windows. 0 disables the cache."""
+        with self._cache_lock:
+            self._cache_max_bytes = max_bytes
+            self._evict()
+
+    def clear_cache(self):
+        """Empty the cache of assembled windows and reset its statistics"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_nbytes = 0
+            self.cache_stats   = {"hits": 0, "misses": 0}
+
+    def cache_info(self) -> dict:
+        """Returns the hits, misses, number of entries and bytes of the cache of assembled windows"""
+        with self._cache_lock:
+            return dict(self.cache_stats, n_entries=len(self._cache),
+                        nbytes=self._cache_nbytes, max_bytes=self._cache_max_bytes)
+
+    def _evict(self):
+        while self._cache_nbytes > self._cache_max_bytes:
+            _, datachunk = self._cache.popitem(last=False)
+            self._cache_nbytes -= datachunk.nbytes
+
+    def _invalidate(self, key:str):
+        with self._cache_lock:
+            for cache_key in [cache_key for cache_key in self._cache.keys() if cache_key[0]==key]:
+                self._cache_nbytes -= self._cache.pop(cache_key).nbytes
+
+    def _cached_assemble(self, key:str, start:int, stop:int, view:bool=False):
+        """_assemble going through the cache when enabled. Views are cheap and thus not cached."""
+        if self._cache_max_bytes <= 0:
+            return self._assemble(key, start, stop, view)
+        with self._cache_lock:
+            datachunk = self._cache.get((key, start, stop))
+            if datachunk is not None:
+                self._cache.move_to_end((key, start, stop))
+                self.cache_stats["hits"] += 1
+                return datachunk, "cache"
+            self.cache_stats["misses"] += 1
+
+        datachunk, access = self._assemble(key, start, stop, view)
+        if access != "view" and datachunk.nbytes <= self._cache_max_bytes:
+            datachunk.setflags(write=False)
+            with self._cache_lock:
+                if (key, start, stop) not in self._cache:
+                    self._cache[(key, start, stop)] = datachunk
+                    self._cache_nbytes += datachunk.nbytes
+                    self._evict()
+        return datachunk, access
+
+    def set_dtype_policy(self, dtype_policy:dict):
+        """Set the dtype policy applied to the DataChunk set in this record, and apply it to the ones already set.
+
+        params:
+            - dtype_policy: Dictionnary of names or groups to lists of candidate dtypes (a name takes precedence
+            over its group), like COMPACT_DTYPE_POLICY. The data of a DataChunk is cast to the first candidate
+            that holds it without loss and is not larger than its dtype. None to disable the policy.
+        """
+        self.dtype_policy = dtype_policy
+        for key, l_datachunk in self._data_dict.items():
+            candidates = _policy_candidates(dtype_policy, key, l_datachunk[0].group)
+            cast_l = [_apply_dtype_policy(datachunk, candidates) for datachunk in l_datachunk]
+            if all(cast is datachunk for cast, datachunk in zip(cast_l, l_datachunk)):
+                continue
+            self._data_dict[key]  = cast_l
+            self._index_dict[key] = IntervalIndex()
+            for cast, datachunk in zip(cast_l, l_datachunk):
+                self._index_dict[key].insert(cast.idx, cast.idx + len(cast), cast)
+                if cast is not datachunk:
+                    self._dirty.setdefault(key, set()).add(cast.idx)
+            self._invalidate(key)
+
+    def mark_dirty(self, datachunk_name:str):
+        """Mark all the DataChunk of a name as modified, to be rewritten by an incremental export_record.
+        Needed after modifying in place the data of a DataChunk already in the record."""
+        self._invalidate(datachunk_name)
+        for datachunk in self._data_dict[datachunk_name]:
+            datachunk._content_hash = None
+        self._dirty.setdefault(datachunk_name, set()).update(dc.idx for dc in self._data_dict[datachunk_name])
+
+    def mark_clean(self):
+        """Forget the modifications made since the last export or import"""
+        self._dirty   = {}
+        self._deleted = set()
+
+    def dirty_keys(self) -> list:
+        """Returns the names modified or deleted since the last export or import"""
+        return list(self._dirty.keys()) + [key for key in self._deleted if key not in self._dirty]
+
+    def memory_report(self) -> pd.DataFrame:
+        """Returns a DataFrame with for each name its group, dtype, shape once assembled, number of DataChunk,
+        bytes of the DataChunk (nbytes), bytes held in RAM (in_memory, excluding lazy and memory mapped
+        DataChunk), fraction of the record covered by the DataChunk (fill_ratio), and the number of lazy,
+        memory mapped, sparse and run-length encoded DataChunk."""
+        rows = []
+        for name, l_datachunk in self._data_dict.items():
+            ref_dc    = l_datachunk[0]
+            is_sparse = [isinstance(dc, SparseDataChunk) for dc in l_datachunk]
+            is_rle    = [isinstance(dc, RLEDataChunk) for dc in l_datachunk]
+            lazy      = [isinstance(dc, LazyDataChunk) and not (isinstance(dc.source, np.ndarray) or sparse.issparse(dc.source))
+                         for dc in l_datachunk]
+            memmap    = [not is_lazy and _memmap_base(dc) is not None for dc, is_lazy in zip(l_datachunk, lazy)]
+            in_memory = sum(dc.nbytes for dc, is_lazy, is_mm in zip(l_datachunk, lazy, memmap) if not (is_lazy or is_mm))
+            covered   = sum(max(0, min(dc.idx+len(dc), self.length) - max(dc.idx, 0)) for dc in l_datachunk)
+            rows.append((name, ref_dc.group, np.result_type(ref_dc.dtype, ref_dc.fill), (self.length, *ref_dc.shape[1:]),
+                         len(l_datachunk), sum(dc.nbytes for dc in l_datachunk), in_memory,
+                         covered/self.length, sum(lazy), sum(memmap), sum(is_sparse), sum(is_rle)))
+        return pd.DataFrame(rows, columns=["name", "group", "dtype", "shape", "n_chunks", "nbytes",
+                                           "in_memory", "fill_ratio", "n_lazy", "n_memmap", "n_sparse", "n_rle"])
+
+    def content_hash(self, datachunk_name:str, include_idx:bool=True) -> str:
+        """Returns a hash of the data under a name, from the content_hash of its DataChunk"""
+        hasher = hashlib.blake2b(digest_size=16)
+        for datachunk in sorted(self._data_dict[datachunk_name], key=lambda dc: dc.idx):
+            hasher.update(content_hash(datachunk, include_idx=include_idx).encode())
+        return hasher.hexdigest()
+
     def get_names_group(self, group_name:str) -> list:
         names = []
         for key, dChunk_l in self._data_dict.items():
@@ -136,13 +739,49 @@ class ContiguousRecord():
         return names
 
     def to_s(self, n_frame):
-        return round(self._frame_time*n_frame,2)
+        """Returns the time in seconds of frames (int or array), rounded to 10ms"""
+        return np.round(self._frame_time*np.asarray(n_frame), 2)
 
     def to_time_str(self, n_frame):
-        s = int(self.to_s(n_frame))
-        m, s = s//60, str(s%60)
-        h, m = str(m//60), str(m%60)
-        return "{0}:{1}:{2}".format('0'*(2-len(h))+h, '0'*(2-len(m))+m, '0'*(2-len(s))+s)
+        """Returns the time of frames as "hh:mm:ss", or a list of those for an array of frames"""
+        s = np.asarray(self.to_s(n_frame)).astype(int)
+        time_str = ["%02d:%02d:%02d" % (sec//3600, (sec//60)%60, sec%60) for sec in s.ravel()]
+        return time_str if s.ndim else time_str[0]
+
+    @property
+    def _main_tp(self) -> np.ndarray:
+        return np.asarray(self._data_dict[self.MAIN_TP][0])
+
+    def frame_to_sample(self, frames) -> np.ndarray:
+        """Returns the samples of the main device (main_tp) of frames, as an array of frames of any shape.
+        Fractional frames are linearly interpolated between the timepoints of main_tp."""
+        frames = np.asarray(frames)
+        if frames.dtype.kind in "iu":
+            return self._main_tp[frames]
+        return np.interp(frames, np.arange(self.length), self._main_tp)
+
+    def sample_to_frame(self, samples, side:str="right") -> np.ndarray:
+        """Returns the frames of samples of the main device, as an array of samples of any shape, by bisection of
+        main_tp in O(n log m). With side="right", the frame is the first one whose timepoint is after the sample
+        (np.argmax(main_tp > sample)), and with side="left" the first one at or after it (np.argmax(main_tp >= sample)).
+        Samples after the last timepoint give the length of the record."""
+        return np.searchsorted(self._main_tp, samples, side=side)
+
+    def frame_to_s(self, frames) -> np.ndarray:
+        """Returns the time in seconds of frames (not rounded, see to_s)"""
+        return np.asarray(frames) * self._frame_time
+
+    def s_to_frame(self, seconds) -> np.ndarray:
+        """Returns the frames displayed at times in seconds"""
+        return np.floor(np.asarray(seconds) / self._frame_time + 1e-9).astype(int)
+
+    def sample_to_s(self, samples) -> np.ndarray:
+        """Returns the time in seconds of samples of the main device, interpolated between the timepoints of main_tp"""
+        return np.interp(samples, self._main_tp, np.arange(self.length)) * self._frame_time
+
+    def s_to_sample(self, seconds) -> np.ndarray:
+        """Returns the samples of the main device at times in seconds, interpolated between the timepoints of main_tp"""
+        return self.frame_to_sample(np.asarray(seconds, dtype=float) / self._frame_time)
 
     def __len__(self):
         return self.length
@@ -151,39 +790,121 @@ class ContiguousRecord():
         if isinstance(key, str):
             if key not in self._data_dict.keys():
                 self._data_dict[key] = []
+                self._index_dict[key] = IntervalIndex()
 
-            if not self.dataset_intersect(self._data_dict[key], value):
+            index = self._index_dict[key]
+            if not index.overlaps(value.idx, value.idx + len(value)):
+                value = _apply_dtype_policy(value, _policy_candidates(self.dtype_policy, key, value.group))
+                index.insert(value.idx, value.idx + len(value), value)
                 self._data_dict[key].append(value)
+                self._dirty.setdefault(key, set()).add(value.idx)
+                self._invalidate(key)
             else:
                 raise ValueError("Data with the same name already exists and intersect with the one provided")
         else:
             raise KeyError("Cannot set data with an integer index, it needs a name")
 
+    def _fill_window(self, out, key:str, start:int, stop:int) -> list:
+        """Write the window [start, stop) of the data under key into out, of shape (stop-start, ...).
+        The gaps between the DataChunk are set to the fill value. Returns the DataChunk written."""
+        fill_value  = self._data_dict[key][0].fill
+        overlapping = self._index_dict[key].query(start, stop)
+        cursor = start
+        for datachunk in overlapping:
+            dc_slice = datachunk.slice
+
+            dc_start = max(dc_slice.start, start) #flooring to the maximum of both start
+            dc_stop  = min(dc_slice.stop, stop) # and capping to the min of both end
+
+            if dc_start > cursor:
+                out[cursor-start:dc_start-start] = fill_value
+            new_dc_slice = slice(dc_start-datachunk.idx, dc_stop-datachunk.idx)
+            res_slice    = slice(dc_start-start, dc_stop-start)
+            out[res_slice] = datachunk[new_dc_slice]
+            cursor = dc_stop
+        if cursor < stop:
+            out[cursor-start:stop-start] = fill_value
+        return overlapping
+
+    def _assemble(self, key:str, start:int, stop:int, view:bool=False):
+        """Returns the DataChunk of the window [start, stop) of the data under key, and the
+        path taken to get it: "view" into a stored DataChunk, "read" of a LazyDataChunk window,
+        or "copy" filled with the fill value."""
+        l_datachunk = self._data_dict[key]
+        fill_value  = l_datachunk[0].fill
+        shape       = l_datachunk[0].shape
+        overlapping = self._index_dict[key].query(start, stop)
+
+        if view and len(overlapping)==1:
+            datachunk = overlapping[0]
+            if datachunk.idx <= start and datachunk.idx + len(datachunk) >= stop:
+                if isinstance(datachunk, LazyDataChunk):
+                    dc_read = DataChunk(datachunk.read(start-datachunk.idx, stop-datachunk.idx),
+                                        start, datachunk.group, datachunk.fill)
+                    dc_read.attrs = dict(datachunk.attrs)
+                    return dc_read, "read"
+                dc_view       = datachunk[start-datachunk.idx:stop-datachunk.idx]
+                dc_view.idx   = start
+                dc_view.attrs = dict(datachunk.attrs)
+                return dc_view, "view"
+
+        dtype = np.result_type(l_datachunk[0].dtype, fill_value)
+        full_sequence = DataChunk(np.empty((stop-start, *shape[1:]), dtype=dtype),
+                                  start, l_datachunk[0].group, fill_value)
+        for datachunk in self._fill_window(full_sequence, key, start, stop):
+            full_sequence.attrs.update(datachunk.attrs)
+
+        return full_sequence, "copy"
+
+    def fetch(self, key:str, start:int=None, stop:int=None, view:bool=None, out=None) -> DataChunk:
+        """Returns the DataChunk of the data under key between start and stop. Unlike __getitem__ with
+        set_slice, fetch does not modify the record, so it can be called concurrently by multiple threads
+        or Data_Pipe on a same ContiguousRecord. Goes through the cache when enabled (see set_cache).
+
+        params:
+            - key: Name of the data
+            - start: Starting index of the window (0 if None)
+            - stop: Stop index of the window (length of the record if None)
+            - view: Return a view when a single DataChunk covers the window. Defaults to self.view_mode
+            - out: Preallocated array of shape (stop-start, ...) in which to write the window, returned
+            instead of a DataChunk
+        """
+        start, stop, _ = slice(start, stop).indices(self.length)
+        if out is not None:
+            if (key, start, stop) in self._cache:
+                out[:] = self._cached_assemble(key, start, stop)[0]
+            else:
+                self._fill_window(out, key, start, stop)
+            return out
+        return self._cached_assemble(key, start, stop, self.view_mode if view is None else view)[0]
+
+    def fetch_sparse(self, key:str, start:int=None, stop:int=None):
+        """Returns the window [start, stop) of the data of shape (time, n) under key as a scipy.sparse
+        CSR matrix, without densifying its SparseDataChunk. The gaps between the DataChunk are zeros."""
+        start, stop, _ = slice(start, stop).indices(self.length)
+        ref_dc = self._data_dict[key][0]
+        if ref_dc.fill != 0 or ref_dc.ndim != 2:
+            raise ValueError("Only data of shape (time, n) with a fill value of 0 can be fetched as sparse")
+        pieces, cursor = [], start
+        for datachunk in self._index_dict[key].query(start, stop):
+            dc_start = max(datachunk.idx, start)
+            dc_stop  = min(datachunk.idx + len(datachunk), stop)
+            if dc_start > cursor:
+                pieces.append(sparse.csr_matrix((dc_start-cursor, ref_dc.shape[1]), dtype=ref_dc.dtype))
+            if isinstance(datachunk, SparseDataChunk):
+                pieces.append(datachunk.read_sparse(dc_start-datachunk.idx, dc_stop-datachunk.idx))
+            else:
+                pieces.append(sparse.csr_matrix(np.asarray(datachunk[dc_start-datachunk.idx:dc_stop-datachunk.idx])))
+            cursor = dc_stop
+        if cursor < stop or len(pieces)==0:
+            pieces.append(sparse.csr_matrix((stop-cursor, ref_dc.shape[1]), dtype=ref_dc.dtype))
+        return sparse.vstack(pieces, format="csr")
+
     def __getitem__(self, key):
         if isinstance(key, str):
-            l_datachunk = self._data_dict[key]
-            fill_value  = l_datachunk[0].fill
-            shape       = l_datachunk[0].shape
-
-            full_sequence = DataChunk(np.zeros((len(range(*self._slice.indices(self.length))), *shape[1:]),
-                                               dtype=l_datachunk[0].dtype)+fill_value,
-                                      self._slice.start if self._slice.start is not None else 0,
-                                      fill_value)
-            for datachunk in l_datachunk:
-                dc_slice = datachunk.slice
-                if dc_slice.start>=self._slice.stop or dc_slice.stop<=self._slice.start:
-                    continue
-
-                start = max(dc_slice.start, self._slice.start) #flooring to the maximum of both start
-                stop  = min(dc_slice.stop, self._slice.stop) # and capping to the min of both end
-
-                new_dc_slice  = slice(start-datachunk.idx, stop-datachunk.idx)
-                res_start = self._slice.start if self._slice.start is not None else 0
-                res_slice = slice(start-res_start, stop-res_start)
-                full_sequence[res_slice] = datachunk.data[new_dc_slice]
-                full_sequence.attrs.update(datachunk.attrs)
-
-            return full_sequence
+            start, stop, _ =self._slice.indices(self.length)
+            datachunk, self.last_access = self._cached_assemble(key, start, stop, self.view_mode)
+            return datachunk
 
     def __iter__(self):
         groups = {"sync":[],"stim":[],"data":[],"cell":[]}
@@ -209,11 +930,17 @@ class ContiguousRecord():
 
     def __delitem__(self, key):
         del self._data_dict[key]
+        del self._index_dict[key]
+        self._dirty.pop(key, None)
+        self._deleted.add(key)
+        self._invalidate(key)
 
     def __str__(self):
         res = "ContiguousRecord:\n"
         for k,v in self._data_dict.items():
             res += k+" : "+" ".join([str(dc.shape) for dc in v]) +"\n"
+        for k,group in self._unloaded.items():
+            res += k+" : not loaded ("+str(group)+")\n"
         return res
 
     def __repr__(self):
@@ -243,18 +970,23 @@ class RecordMaster(list):
     params:
         - reference_data_list: list of (timepoints, signals) arrays.
         - frame_rate: Frame rate in Hz, or list of frame rates matching len(reference_data_list)
+        - dtype_policy: Optional dtype policy of the sequences, see ContiguousRecord.set_dtype_policy
     """
 
-    def __init__(self, reference_data_list: Sequence[Tuple[DataChunk, DataChunk]], frame_rate=60):
+    def __init__(self, reference_data_list: Sequence[Tuple[DataChunk, DataChunk]], frame_rate=60, dtype_policy=None):
 
         if not hasattr(frame_rate, '__iter__'):
             frame_rate = [frame_rate]*len(reference_data_list)
 
         self._sep_size   = 1000 #Used for the plotting of multiple sequences
+        self._h5_file    = None #Open file of the LazyDataChunk when imported with lazy=True
+        self._dir_store  = None #Directory of the memory mapped or lazy DataChunk when imported with lazy=True
+        self._source     = None #(path, indexes of the sequences imported, number of sequences) of an imported record
         self._sequences = []
         for (ref_timepoints, ref_signals), fr in zip(reference_data_list, frame_rate):
             cs = ContiguousRecord(len(ref_timepoints), ref_signals, ref_timepoints, fr)
             self._sequences.append(cs)
+        self.set_dtype_policy(dtype_policy)
 
     def set_datachunk(self, dc:DataChunk, name:str, sequence_idx=0):
         """Set the given DataChunk dc for the sequence at sequence_idx under name."""
@@ -262,18 +994,49 @@ class RecordMaster(list):
 
     def append(self, ref_timepoints:DataChunk, ref_signals:DataChunk, frame_rate=60):
         cs = ContiguousRecord(len(ref_timepoints), ref_signals, ref_timepoints, frame_rate)
+        cs.set_dtype_policy(self.dtype_policy)
         self._sequences.append(cs)
 
     def insert(self, idx:int, ref_timepoints:DataChunk, ref_signals:DataChunk, frame_rate=60):
         cs = ContiguousRecord(len(ref_timepoints), ref_signals, ref_timepoints, frame_rate)
+        cs.set_dtype_policy(self.dtype_policy)
         self._sequences.insert(idx, cs)
 
+    def set_cache(self, max_bytes:int):
+        """Set the maximum bytes of the LRU cache of assembled windows of each sequence. 0 disables the caches."""
+        for seq in self._sequences:
+            seq.set_cache(max_bytes)
+
+    def set_dtype_policy(self, dtype_policy:dict):
+        """Set the dtype policy of each sequence, see ContiguousRecord.set_dtype_policy"""
+        self.dtype_policy = dtype_policy
+        for seq in self._sequences:
+            seq.set_dtype_policy(dtype_policy)
+
+    def memory_report(self, by:str=None)-> pd.DataFrame:
+        """Returns the memory report of the sequences (see ContiguousRecord.memory_report) in a single DataFrame
+        with a "sequence" column. If by is "sequence", "group" or "name", returns instead the nbytes and
+        in_memory summed by that column."""
+        report = pd.concat([seq.memory_report().assign(sequence=i) for i, seq in enumerate(self._sequences)],
+                           ignore_index=True)
+        report = report[["sequence"] + [col for col in report.columns if col!="sequence"]]
+        if by is not None:
+            return report.groupby(by)[["nbytes", "in_memory"]].sum()
+        return report
+
     def keys(self):
         keys = []
         for seq in self._sequences:
             keys.extend(list(seq.keys()))
         return set(keys)
 
+    def available_keys(self):
+        """Returns the keys of all sequences, including the ones not loaded by import_record"""
+        keys = []
+        for seq in self._sequences:
+            keys.extend(seq.available_keys())
+        return set(keys)
+
     def __setitem__(self, key, value:DataChunk):
         """Setting an item directly to the record_master place it in the first sequence"""
         if isinstance(key, str):
@@ -306,6 +1069,18 @@ class RecordMaster(list):
     def __len__(self):
         return len(self._sequences)
 
+    def close(self):
+        """Close the file backing the LazyDataChunk of a record imported with lazy=True"""
+        if self._h5_file is not None:
+            self._h5_file.close()
+            self._h5_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def plot(self, ax=None, show_time=True, sort_by_name=False):
         colors = {"sync":"cornflowerblue", "stim":"orange", "data":"yellowgreen", "cell":"plum"}
         if ax is None:
@@ -369,6 +1144,83 @@ class RecordMaster(list):
             del seq
 
 # Cell
+def _merge_intervals(intervals) -> list:
+    """Sort and merge overlapping or touching [start, stop) intervals, dropping the empty ones"""
+    merged = []
+    for start, stop in sorted(intervals):
+        if stop <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+def _combine_intervals(intervals_a:list, intervals_b:list, op) -> list:
+    """Combine two merged lists of [start, stop) intervals with a boolean operation op(in_a, in_b).
+    The cost scales with the number of intervals, not with their lengths."""
+    bounds = sorted(set([x for interval in intervals_a+intervals_b for x in interval]))
+    result = []
+    i_a, i_b = 0, 0
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        while i_a < len(intervals_a) and intervals_a[i_a][1] <= start:
+            i_a += 1
+        while i_b < len(intervals_b) and intervals_b[i_b][1] <= start:
+            i_b += 1
+        in_a = i_a < len(intervals_a) and intervals_a[i_a][0] <= start
+        in_b = i_b < len(intervals_b) and intervals_b[i_b][0] <= start
+        if op(in_a, in_b):
+            if result and result[-1][1] == start:
+                result[-1] = (result[-1][0], stop)
+            else:
+                result.append((start, stop))
+    return result
+
+class _RunningStats():
+    """Count, sum, mean, variance, min and max along the first axis of data given by blocks of rows, each row
+    being weighted by its number of repeats. Blocks are merged with the pairwise update of Chan et al., so the
+    variance stays accurate without keeping the data."""
+    def __init__(self):
+        self.count = 0
+        self.sum   = self.mean = self.m2 = self.min = self.max = None
+
+    def update(self, values, weights=None):
+        """Add a block of rows, repeated weights times (once when weights is None)"""
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+        weights  = np.ones(len(values), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        w_shaped = weights.reshape((-1,) + (1,)*(values.ndim-1))
+        block = _RunningStats()
+        block.count = int(weights.sum())
+        block.sum   = np.sum(values * w_shaped, axis=0)
+        block.mean  = block.sum / block.count
+        block.m2    = np.sum(w_shaped * (values - block.mean)**2, axis=0)
+        block.min   = np.min(values, axis=0)
+        block.max   = np.max(values, axis=0)
+        self.merge(block)
+
+    def merge(self, other):
+        """Merge the statistics of other into self"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.sum, self.mean, self.m2, self.min, self.max = (other.count, other.sum, other.mean,
+                                                                            other.m2, other.min, other.max)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean  = self.mean + delta * other.count / count
+        self.m2    = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.sum   = self.sum + other.sum
+        self.min   = np.minimum(self.min, other.min)
+        self.max   = np.maximum(self.max, other.max)
+        self.count = count
+
+    def result(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "mean": self.mean,
+                "var": None if self.count == 0 else self.m2 / self.count, "min": self.min, "max": self.max}
+
 class Data_Pipe():
     """
     A Data_Pipe is used to query data from a RecordMaster. By adding/substracting portions
@@ -396,7 +1248,7 @@ class Data_Pipe():
 
         self.target_names = target_names
         self.data_names   = data_names
-        self._masks       = [np.zeros(len(seq), dtype=bool) for seq in record_master]
+        self._intervals   = [[] for seq in record_master] #Sorted [start, stop) intervals of each sequence
         self._slices      = []
 
         self.cast_to_np   = cast_to_np
@@ -428,7 +1280,7 @@ class Data_Pipe():
         new_pipe =  Data_Pipe(record_master=self.record_master,
                          data_names=self.data_names,
                          target_names=self.target_names)
-        new_pipe._masks = np.copy(self._masks)
+        new_pipe._intervals = [list(intervals) for intervals in self._intervals]
         new_pipe._slices = self._slices.copy()
         return new_pipe
 
@@ -444,91 +1296,94 @@ class Data_Pipe():
                     dchunk_name.append(name)
         return list(set(dchunk_name))
 
+    @property
+    def _masks(self):
+        """Boolean masks of each sequence, built from the intervals of the pipe"""
+        masks = []
+        for seq, intervals in zip(self.record_master, self._intervals):
+            mask = np.zeros(len(seq), dtype=bool)
+            for start, stop in intervals:
+                mask[start:stop] = 1
+            masks.append(mask)
+        return masks
+
+    @_masks.setter
+    def _masks(self, masks):
+        self._intervals = []
+        for mask in masks:
+            mask = np.concatenate(([0],np.asarray(mask, dtype=int),[0])) #Putting zeros on the side in case the limits would be ones
+            self._intervals.append([(int(start), int(stop)) for start, stop in np.where(mask[1:]-mask[:-1])[0].reshape(-1,2)])
+
     def _intersect_names(self):
         for i, seq in enumerate(self.record_master):
             for name in self.data_names:
                 if name not in seq.keys():
-                    self._masks[i] = np.zeros(len(seq), dtype=bool)
+                    self._intervals[i] = []
                     break
 
     def _update_slices(self):
 #         self._intersect_names() #Always intersect the names we wanna retrieve ? Might be not needed (even cause bug)
         self._slices = []
-        #Iterating the list of mask (one per seq of the record_master)
-        for j, mask in enumerate(self._masks):
-            seq = self.record_master[j]
-            mask = np.concatenate(([0],mask,[0])) #Putting zeros on the side in case the limits would be ones
-            for start, stop in np.where(mask[1:]-mask[:-1])[0].reshape(-1,2):#Split the mask where 0 separates the 1
+        #Iterating the list of intervals (one per seq of the record_master)
+        for j, intervals in enumerate(self._intervals):
+            for start, stop in intervals:
                 self._slices.append((j, slice(start,stop)))
 
+    def _combine(self, names:Union[str, list], op):
+        """Combine the intervals of the pipe with the ones of the DataChunk names, using op(in_pipe, in_names)"""
+        dchunk_name = self._get_dchunk_names(names)
+        for i, seq in enumerate(self.record_master):
+            names_intervals = _merge_intervals((max(0, slice_.start), min(len(seq), slice_.stop))
+                                               for name in dchunk_name
+                                               for slice_ in seq.get_slice(name))
+            self._intervals[i] = _combine_intervals(self._intervals[i], names_intervals, op)
+        self._update_slices()
+        return self
+
     def __ior__(self, names:Union[str, list]):
         return self.__iadd__(names)
     def __or__(self, names:Union[str, list]):
         return self.copy().__ior__(names)
 
     def __iand__(self, names:Union[str, list]):
-        dchunk_name = self._get_dchunk_names(names)
-        for i, seq in enumerate(self.record_master):
-            new_mask = np.zeros(len(seq), dtype=bool)
-            for name in dchunk_name:
-                for slice_ in seq.get_slice(name):
-                    new_mask[slice_] = 1
-            self._masks[i] &= new_mask
-        self._update_slices()
-        return self
+        return self._combine(names, lambda in_pipe, in_names: in_pipe and in_names)
     def __and__(self, names:Union[str, list]):
         return self.copy().__iand__(names)
 
     def __ixor__(self, names:Union[str, list]):
-        dchunk_name = self._get_dchunk_names(names)
-        for i, seq in enumerate(self.record_master):
-            new_mask = np.zeros(len(seq), dtype=bool)
-            for name in dchunk_name:
-                for slice_ in seq.get_slice(name):
-                    new_mask[slice_] = 1
-            self._masks[i] ^= new_mask
-        self._update_slices()
-        return self
+        return self._combine(names, lambda in_pipe, in_names: in_pipe != in_names)
     def __xor__(self, names:Union[str, list]):
         return self.copy().__ixor__(names)
 
     def __iadd__(self, names:Union[str, list]):
-        dchunk_name = self._get_dchunk_names(names)
-        for i, seq in enumerate(self.record_master):
-            for name in dchunk_name:
-                for slice_ in seq.get_slice(name):
-                    self._masks[i][slice_] = 1
-        self._update_slices()
-        return self
+        return self._combine(names, lambda in_pipe, in_names: in_pipe or in_names)
     def __add__(self, names:Union[str, list]):
         return self.copy().__iadd__(names)
 
     def __isub__(self, names:Union[str, list]):
-        dchunk_name = self._get_dchunk_names(names)
-        for i, seq in enumerate(self.record_master):
-            for name in dchunk_name:
-                for slice_ in seq.get_slice(name):
-                    self._masks[i][slice_] = 0
-        self._update_slices()
-        return self
+        return self._combine(names, lambda in_pipe, in_names: in_pipe and not in_names)
     def __sub__(self, names:Union[str, list]):
         return self.copy().__isub__(names)
 
+    def _fetch(self, seq_idx:int, _slice:slice) -> dict:
+        """Fetch the data of a slice from the record_master, without modifying its state"""
+        res = {}
+        seq = self.record_master[seq_idx]
+        for i, name in enumerate(self.data_names):
+            datachunk = seq.fetch(name, _slice.start, _slice.stop)
+            if self.cast_to_np:
+                res[self.target_names[i]] = np.array(datachunk)
+            else:
+                res[self.target_names[i]] = datachunk
+        return res
+
     def __iter__(self):
         self._n = 0
         return self
 
     def __next__(self):
         if self._n < len(self):
-            res = {}
-            seq_idx, _slice = self._slices[self._n]
-            self.record_master[seq_idx].set_slice(_slice)
-            for i, name in enumerate(self.data_names):
-                if self.cast_to_np:
-                    res[self.target_names[i]] = np.array(self.record_master[seq_idx][name])
-                else:
-                    res[self.target_names[i]] = self.record_master[seq_idx][name]
-            self.record_master[seq_idx].set_slice(None)
+            res = self._fetch(*self._slices[self._n])
             self._n += 1
             return res
         else:
@@ -539,31 +1394,196 @@ class Data_Pipe():
 
     def __getitem__(self, key):
         if isinstance(key, (int, np.integer)):
-            seq_idx, _slice = self._slices[key]
-            self.record_master[seq_idx].set_slice(_slice)
-            res = {}
-            for i, name in enumerate(self.data_names):
-                if self.cast_to_np:
-                    res[self.target_names[i]] = np.array(self.record_master[seq_idx][name])
-                else:
-                    res[self.target_names[i]] = self.record_master[seq_idx][name]
-            self.record_master[seq_idx].set_slice(None)
-            return res
+            return self._fetch(*self._slices[key])
         elif isinstance(key, slice):
-            l_res = []
-            for seq_idx, _slice in self._slices[key]:
-                res = {}
-                for i, name in enumerate(self.data_names):
-                    if self.cast_to_np:
-                        res[self.target_names[i]] = np.array(self.record_master[seq_idx][name][_slice])
-                    else:
-                        res[self.target_names[i]] = self.record_master[seq_idx][name][_slice]
-
-                l_res.append(res)
-            return l_res
+            return [self._fetch(seq_idx, _slice) for seq_idx, _slice in self._slices[key]]
         else:
             raise IndexError ("only integers and slices (`:`) are valid indices")
 
+    def _slice_nbytes(self, seq_idx:int, _slice:slice) -> int:
+        """Bytes taken by the data of a slice once fetched"""
+        seq    = self.record_master[seq_idx]
+        nbytes = 0
+        for name in self.data_names:
+            ref_dc = seq._data_dict[name][0]
+            dtype  = np.result_type(ref_dc.dtype, ref_dc.fill)
+            nbytes += (_slice.stop - _slice.start) * int(np.prod(ref_dc.shape[1:])) * dtype.itemsize
+        return nbytes
+
+    def estimate_memory(self) -> dict:
+        """Estimate the bytes needed to materialise the pipe: "slice" for the largest slice, which is
+        the peak of an iteration over the pipe, and "total" for all the slices at once (e.g. batch)"""
+        nbytes = [self._slice_nbytes(seq_idx, _slice) for seq_idx, _slice in self._slices]
+        return {"slice": max(nbytes, default=0), "total": sum(nbytes)}
+
+    def prefetch(self, depth:int=4, n_workers:int=2, max_bytes:int=None):
+        """Returns a PrefetchIterator over the slices of the pipe, fetching the next slices in background threads.
+        See PrefetchIterator for the parameters."""
+        return PrefetchIterator(self, depth=depth, n_workers=n_workers, max_bytes=max_bytes)
+
+    def batch(self, mode:str="concat", pad_value=None) -> dict:
+        """Returns the data of all the slices of the pipe, written in arrays preallocated for each target name.
+
+        params:
+            - mode: "concat" to concatenate the slices along time. Each target name gets a tuple (array of shape
+            (total_len, ...), offsets of shape (n_slices+1,)), the slice i being array[offsets[i]:offsets[i+1]].
+            "pad" to stack the slices. Each target name gets a tuple (array of shape (n_slices, max_len, ...),
+            lengths of shape (n_slices,)).
+            - pad_value: Value after the end of the slices shorter than max_len in "pad" mode. Defaults to the fill
+            value of the data. The dtype of the array is promoted to hold it (e.g. float for np.nan).
+
+        return:
+            - Dictionnary of the (array, offsets) or (array, lengths) tuples of each target name
+        """
+        if mode not in ["concat", "pad"]:
+            raise ValueError("mode must be \"concat\" or \"pad\", not %s" % repr(mode))
+        lengths = np.array([_slice.stop - _slice.start for _, _slice in self._slices], dtype=int)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+        res = {}
+        for name, target in zip(self.data_names, self.target_names):
+            ref_dc = [seq._data_dict[name][0] for seq in self.record_master if name in seq.keys()]
+            if len(ref_dc)==0:
+                raise KeyError(name)
+            ref_dc = ref_dc[0]
+            dtype  = np.result_type(ref_dc.dtype, ref_dc.fill)
+            if mode == "concat":
+                out = np.empty((offsets[-1], *ref_dc.shape[1:]), dtype=dtype)
+                for (seq_idx, _slice), start, stop in zip(self._slices, offsets[:-1], offsets[1:]):
+                    self.record_master[seq_idx].fetch(name, _slice.start, _slice.stop, out=out[start:stop])
+                res[target] = (out, offsets)
+            else:
+                pad   = ref_dc.fill if pad_value is None else pad_value
+                dtype = np.result_type(dtype, pad) #e.g. float for a NaN padding of integers
+                out   = np.full((len(self), lengths.max(initial=0), *ref_dc.shape[1:]), pad, dtype=dtype)
+                for i, (seq_idx, _slice) in enumerate(self._slices):
+                    self.record_master[seq_idx].fetch(name, _slice.start, _slice.stop, out=out[i, :lengths[i]])
+                res[target] = (out, lengths)
+        return res
+
+    def _iter_blocks(self, seq_idx:int, _slice:slice, name:str, chunk_bytes:int):
+        """Yields the data of name in a slice as (values, weights) blocks of rows, weights being the number of
+        repeats of each row (None for once): windows of chunk_bytes of the DataChunk (read from lazy or memory
+        mapped data without loading it whole), frames of the RLEDataChunk with their repeats, and the fill value
+        repeated over each gap between the DataChunk. No window of the slice is assembled."""
+        seq      = self.record_master[seq_idx]
+        ref_dc   = seq._data_dict[name][0]
+        fill_row = np.full((1, *ref_dc.shape[1:]), ref_dc.fill, dtype=np.result_type(ref_dc.dtype, ref_dc.fill))
+        step     = max(1, chunk_bytes // max(1, int(np.prod(ref_dc.shape[1:])) * ref_dc.dtype.itemsize))
+        cursor   = _slice.start
+        for datachunk in seq.get_index(name).query(_slice.start, _slice.stop):
+            start = max(_slice.start, datachunk.idx) - datachunk.idx
+            stop  = min(_slice.stop, datachunk.idx + len(datachunk)) - datachunk.idx
+            if datachunk.idx + start > cursor:
+                yield fill_row, [datachunk.idx + start - cursor]
+            if isinstance(datachunk, RLEDataChunk):
+                first = np.searchsorted(datachunk._run_stops, start, side="right")
+                last  = np.searchsorted(datachunk._run_stops, stop-1, side="right") + 1
+                for run_start in range(first, last, step):
+                    run_stop = min(run_start + step, last)
+                    repeats  = (np.minimum(datachunk._run_stops[run_start:run_stop], stop)
+                                - np.maximum(datachunk._run_starts[run_start:run_stop], start))
+                    yield np.asarray(datachunk.frames[run_start:run_stop]), repeats
+            else:
+                for block_start in range(start, stop, step):
+                    block_stop = min(block_start + step, stop)
+                    if isinstance(datachunk, LazyDataChunk):
+                        yield datachunk.read(block_start, block_stop), None
+                    else:
+                        yield np.asarray(datachunk[block_start:block_stop]), None
+            cursor = datachunk.idx + stop
+        if cursor < _slice.stop:
+            yield fill_row, [_slice.stop - cursor]
+
+    def stats(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the count, sum, mean, var (with ddof=0), min and max along time of the data of the pipe, computed
+        by streaming through each slice in blocks of chunk_bytes. The gaps between the DataChunk are counted as
+        their fill value, like in the slices returned by the pipe, but without being assembled.
+
+        params:
+            - per_slice: If True, returns the statistics of each slice instead of the ones over all the slices
+            - chunk_bytes: Bytes of data read at once, to reduce lazy or memory mapped data with bounded memory
+
+        return:
+            - Dictionnary of the statistics of each target name (a dict of arrays of the shape of the data without
+            time), or of the lists of the statistics of each slice when per_slice is True
+        """
+        res = {}
+        for name, target in zip(self.data_names, self.target_names):
+            slice_stats = []
+            for seq_idx, _slice in self._slices:
+                running = _RunningStats()
+                for values, weights in self._iter_blocks(seq_idx, _slice, name, chunk_bytes):
+                    running.update(values, weights)
+                slice_stats.append(running)
+            if per_slice:
+                res[target] = [running.result() for running in slice_stats]
+            else:
+                total = _RunningStats()
+                for running in slice_stats:
+                    total.merge(running)
+                res[target] = total.result()
+        return res
+
+    def _stat(self, stat:str, per_slice:bool, chunk_bytes:int) -> dict:
+        return {target: [res[stat] for res in stats] if per_slice else stats[stat]
+                for target, stats in self.stats(per_slice, chunk_bytes).items()}
+
+    def sum(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the sum along time of the data of the pipe for each target name, see stats"""
+        return self._stat("sum", per_slice, chunk_bytes)
+
+    def mean(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the mean along time of the data of the pipe for each target name, see stats"""
+        return self._stat("mean", per_slice, chunk_bytes)
+
+    def var(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the variance along time of the data of the pipe for each target name, see stats"""
+        return self._stat("var", per_slice, chunk_bytes)
+
+    def min(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the minimum along time of the data of the pipe for each target name, see stats"""
+        return self._stat("min", per_slice, chunk_bytes)
+
+    def max(self, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the maximum along time of the data of the pipe for each target name, see stats"""
+        return self._stat("max", per_slice, chunk_bytes)
+
+    def histogram(self, bins=10, range:tuple=None, per_slice:bool=False, chunk_bytes:int=2**24) -> dict:
+        """Returns the histogram of all the values of the data of the pipe for each target name, computed by
+        streaming through each slice like stats.
+
+        params:
+            - bins: Number of bins, or sequence of the bin edges (see np.histogram)
+            - range: (min, max) of the bins. Defaults to the min and max of the data, which then takes a first
+            pass over the data
+            - per_slice: If True, returns the counts of each slice
+            - chunk_bytes: Bytes of data read at once
+
+        return:
+            - Dictionnary of the (counts, bin_edges) of each target name, counts being a list of the counts of each
+            slice when per_slice is True
+        """
+        if range is None and np.ndim(bins) == 0:
+            mins, maxs = self.min(chunk_bytes=chunk_bytes), self.max(chunk_bytes=chunk_bytes)
+        res = {}
+        for name, target in zip(self.data_names, self.target_names):
+            if np.ndim(bins) > 0:
+                edges = np.asarray(bins)
+            elif range is not None:
+                edges = np.histogram_bin_edges([], bins, range)
+            else:
+                edges = np.histogram_bin_edges([], bins, (np.min(mins[target]), np.max(maxs[target])))
+            slice_counts = []
+            for seq_idx, _slice in self._slices:
+                counts = np.zeros(len(edges)-1, dtype=np.int64)
+                for values, weights in self._iter_blocks(seq_idx, _slice, name, chunk_bytes):
+                    weights = None if weights is None else np.broadcast_to(
+                        np.reshape(weights, (-1,) + (1,)*(np.ndim(values)-1)), np.shape(values))
+                    counts += np.histogram(values, edges, weights=weights)[0].astype(np.int64)
+                slice_counts.append(counts)
+            res[target] = (slice_counts if per_slice else np.sum(slice_counts, axis=0, dtype=np.int64), edges)
+        return res
+
     def __str__(self):
         return "(datachunks, targets, slices), "+self.__repr__()
 
@@ -571,53 +1591,453 @@ class Data_Pipe():
         return "Pipe(%s)"%(repr(self.data_names)+", "+repr(self.target_names)+", "+repr(self._slices))
 
 # Cell
-def export_record(path, record_master):
+def _stop_prefetch(executor, pending:deque, wait:bool):
+    """Cancel the pending fetches of a PrefetchIterator and stop its threads"""
+    for future, _ in pending:
+        future.cancel()
+    pending.clear()
+    executor.shutdown(wait=wait)
+
+class PrefetchIterator():
+    """Iterator over the slices of a Data_Pipe that fetches the next slices in a thread pool while the
+    current one is processed. Usefull when the record is backed by a disk (lazy import, memmap).
+
+    params:
+        - data_pipe: The Data_Pipe to iterate
+        - depth: Maximum number of slices fetched in advance
+        - n_workers: Number of fetching threads
+        - max_bytes: Maximum bytes of the slices fetched in advance (at least one slice is always fetched)
+
+    The statistics of the iteration are kept in self.stats:
+        - n_slices: Number of slices returned
+        - wait_time: Seconds spent by the consumer waiting for a slice (I/O not hidden by the prefetching)
+        - fetch_time: Seconds spent by the threads fetching the slices
+        - peak_bytes: Maximum bytes of the slices fetched in advance
+
+    The threads are stopped when the iteration ends, or when the iterator is garbage collected (e.g. after a
+    break in a for loop). To release them deterministically, use it in a with statement:
+
+        with pipe.prefetch() as prefetcher:
+            for data_dict in prefetcher:
+                ...
+    """
+    def __init__(self, data_pipe, depth:int=4, n_workers:int=2, max_bytes:int=None):
+        self.data_pipe = data_pipe
+        self.depth     = max(1, depth)
+        self.max_bytes = max_bytes
+        self.stats     = {"n_slices": 0, "wait_time": 0., "fetch_time": 0., "peak_bytes": 0}
+
+        self._executor = ThreadPoolExecutor(n_workers)
+        self._lock     = threading.Lock()
+        self._pending  = deque() #(future, nbytes) of the slices in fetching order
+        self._nbytes   = 0
+        self._n_submit = 0
+        #Does not reference self, so an abandoned iterator can be collected (once its fetches are done)
+        self._finalizer = weakref.finalize(self, _stop_prefetch, self._executor, self._pending, False)
+        self._fill_queue()
+
+    def _fetch(self, i:int) -> dict:
+        t_start = time.perf_counter()
+        res = self.data_pipe[i]
+        with self._lock:
+            self.stats["fetch_time"] += time.perf_counter() - t_start
+        return res
+
+    def _fill_queue(self):
+        while self._n_submit < len(self.data_pipe) and len(self._pending) < self.depth:
+            nbytes = self.data_pipe._slice_nbytes(*self.data_pipe._slices[self._n_submit])
+            if (self.max_bytes is not None and len(self._pending) > 0
+                    and self._nbytes + nbytes > self.max_bytes):
+                break
+            self._pending.append((self._executor.submit(self._fetch, self._n_submit), nbytes))
+            self._nbytes   += nbytes
+            self._n_submit += 1
+            self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self._nbytes)
+
+    def close(self):
+        """Cancel the pending fetches and stop the threads"""
+        self._finalizer.detach()
+        _stop_prefetch(self._executor, self._pending, wait=True)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if len(self._pending) == 0:
+            self.close()
+            raise StopIteration
+        future, nbytes = self._pending.popleft()
+        t_start = time.perf_counter()
+        res = future.result()
+        self.stats["wait_time"] += time.perf_counter() - t_start
+        self.stats["n_slices"]  += 1
+        self._nbytes -= nbytes
+        self._fill_queue()
+        return res
+
+    def __len__(self):
+        return len(self.data_pipe)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Cell
+def _h5_compression(compression, compression_opts):
+    """Returns the h5py dataset keywords of a codec"""
+    if compression is None:
+        return {}
+    elif compression == "lzf":
+        return {"compression": "lzf"}
+    elif compression == "gzip":
+        return {"compression": "gzip", "compression_opts": compression_opts}
+    raise ValueError("Compression must be None, \"lzf\" or \"gzip\", not %s" % repr(compression))
+
+def _write_dataset(group, name, data, compression, compression_opts, chunk_len, executor):
+    """Write data of shape (t, ...) in a new dataset of group, by blocks of chunk_len timepoints.
+    Gzip chunks are compressed in the executor threads and written directly in the file.
+    Uncompressed data without chunk_len is written contiguously, so it can be memory mapped.
+    The data is only read by blocks, so memory mapped or lazy data is never loaded whole."""
+    shape, dtype = tuple(data.shape), np.dtype(data.dtype)
+    if np.prod(shape)==0 or dtype.kind not in "biufc":
+        return group.create_dataset(name, data=np.asarray(data), **_h5_compression(compression, compression_opts))
+
+    contiguous = compression is None and chunk_len is None
+    if chunk_len is None: #About 1MB per chunk
+        chunk_len = (1<<20) // max(1, int(np.prod(shape[1:])) * dtype.itemsize)
+    chunk_len = int(max(1, min(chunk_len, shape[0])))
+    if contiguous:
+        dset = group.create_dataset(name, shape=shape, dtype=dtype)
+        for start in range(0, shape[0], chunk_len):
+            dset[start:start+chunk_len] = data[start:start+chunk_len]
+        return dset
+    chunks    = (chunk_len, *shape[1:])
+    dset = group.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                **_h5_compression(compression, compression_opts))
+    starts = range(0, shape[0], chunk_len)
+    if compression != "gzip":
+        for start in starts:
+            dset[start:start+chunk_len] = data[start:start+chunk_len]
+        return dset
+
+    def compress_chunk(start):
+        block = np.asarray(data[start:start+chunk_len], dtype=dtype)
+        if len(block) < chunk_len: #Edge chunks are stored with the full chunk shape
+            full_block = np.zeros(chunks, dtype=dtype)
+            full_block[:len(block)] = block
+            block = full_block
+        return zlib.compress(np.ascontiguousarray(block).tobytes(), 4 if compression_opts is None else compression_opts)
+
+    batch_size = 4 * getattr(executor, "_max_workers", 1) #Bounds the compressed chunks held in memory
+    for i in range(0, len(starts), batch_size):
+        batch_starts = starts[i:i+batch_size]
+        for start, compressed in zip(batch_starts, executor.map(compress_chunk, batch_starts)):
+            dset.id.write_direct_chunk((start,)+(0,)*(len(shape)-1), compressed)
+    return dset
+
+def _write_sparse(stream_ref, name, datachunk, h5_kwargs):
+    """Write a SparseDataChunk as a group of its CSR arrays, and returns the group"""
+    csr = datachunk.tocsr()
+    sparse_ref = stream_ref.create_group(name)
+    for array_name in ["data", "indices", "indptr"]:
+        array = getattr(csr, array_name)
+        sparse_ref.create_dataset(array_name, data=array, **(h5_kwargs if array.size else {}))
+    sparse_ref.attrs["__sparse"] = "csr"
+    sparse_ref.attrs["__shape"]  = csr.shape
+    return sparse_ref
+
+def _write_rle(stream_ref, name, datachunk, compression, compression_opts, chunk_len, executor):
+    """Write a RLEDataChunk as a group of its frames and repeats, and returns the group"""
+    rle_ref = stream_ref.create_group(name)
+    _write_dataset(rle_ref, "frames", np.asarray(datachunk.frames), compression, compression_opts, chunk_len, executor)
+    rle_ref.create_dataset("repeats", data=datachunk.repeats)
+    rle_ref.attrs["__rle"] = "frames"
+    return rle_ref
+
+def _h5_sizes(h5_obj) -> tuple:
+    """Returns the bytes and the bytes stored in the file of a dataset, or of the datasets of a group"""
+    if isinstance(h5_obj, h5py.Group):
+        sizes = [_h5_sizes(h5_obj[key]) for key in h5_obj.keys()]
+        return sum(size[0] for size in sizes), sum(size[1] for size in sizes)
+    return h5_obj.size * h5_obj.dtype.itemsize, h5_obj.id.get_storage_size()
+
+def _list_to_array(value, min_len:int=32):
+    """Returns the array of a list of numbers or strings, or the structured array (a field per column) of a list of
+    equal length tuples of numbers or strings, to store it as a dataset instead of json. Returns None for other
+    values, short lists, or lists whose json values could not be read back identically (mixed types in a column)."""
+    if not isinstance(value, (list, tuple)) or len(value) < min_len:
+        return None
+    if all(isinstance(row, (list, tuple)) for row in value):
+        n_col = len(value[0])
+        if n_col == 0 or any(len(row) != n_col for row in value):
+            return None
+        columns = list(zip(*value))
+    else:
+        columns = [value]
+
+    col_arrays = []
+    for column in columns:
+        types = set(map(type, column))
+        try:
+            if types == {int}:
+                col_arrays.append(np.array(column, dtype=np.int64))
+            elif types == {float}:
+                col_arrays.append(np.array(column, dtype=np.float64))
+            elif types == {str}:
+                col_arrays.append(np.array([val.encode() for val in column], dtype=bytes))
+            else:
+                return None
+        except OverflowError:
+            return None
+    if len(col_arrays) == 1 and not isinstance(value[0], (list, tuple)):
+        return col_arrays[0]
+    array = np.empty(len(value), dtype=[("f%d" % i, col.dtype) for i, col in enumerate(col_arrays)])
+    for i, col in enumerate(col_arrays):
+        array["f%d" % i] = col
+    return array
+
+def _array_to_list(dset) -> list:
+    """Read a list stored by _list_to_array, as json would (tuples are read as lists)"""
+    def column_tolist(column):
+        if column.dtype.kind == "S":
+            return [val.decode() for val in column.tolist()]
+        return column.tolist()
+    data = dset[:]
+    if data.dtype.names is None:
+        return column_tolist(data)
+    return [list(row) for row in zip(*[column_tolist(data[name]) for name in data.dtype.names])]
+
+def _write_datachunk(stream_ref, datachunk, compression, compression_opts, chunk_len, executor, suffix=""):
+    """Write a DataChunk and its attrs in the group of its stream, and returns its dataset
+    (or its h5 group for a SparseDataChunk or a RLEDataChunk)"""
+    h5_kwargs = _h5_compression(compression, compression_opts)
+    if isinstance(datachunk, SparseDataChunk):
+        dset = _write_sparse(stream_ref, str(datachunk.idx)+suffix, datachunk, h5_kwargs)
+    elif isinstance(datachunk, RLEDataChunk):
+        dset = _write_rle(stream_ref, str(datachunk.idx)+suffix, datachunk, compression,
+                          compression_opts, chunk_len, executor)
+    else:
+        dset = _write_dataset(stream_ref, str(datachunk.idx)+suffix, datachunk, compression,
+                              compression_opts, chunk_len, executor)
+    ndarray_ref = stream_ref.create_group("__ndarray_"+str(datachunk.idx)+suffix)
+    for attr_k, attr_v in datachunk.attrs.items():
+        list_array = None if isinstance(attr_v, np.ndarray) else _list_to_array(attr_v)
+        if isinstance(attr_v, (np.ndarray,)):
+            ndarray_ref.create_dataset(attr_k, data=attr_v, **(h5_kwargs if attr_v.ndim else {}))
+        elif list_array is not None: #Long lists like frame_replacement are stored as datasets, faster than json
+            ndarray_ref.create_dataset(attr_k, data=list_array, **h5_kwargs)
+            ndarray_ref[attr_k].attrs["__list"] = True
+        else:
+            dset.attrs[attr_k] = json.dumps(attr_v)
+    dset.attrs["__fill"] = datachunk.fill
+    dset.attrs["__hash"] = content_hash(datachunk, include_idx=False, refresh=_is_writeable(datachunk))
+    dset.attrs["__group"] = datachunk.group
+    return dset
+
+def _is_backed_by(datachunk, h5_f) -> bool:
+    """Check if the data of a DataChunk is read from the file h5_f (lazy or memory mapped)"""
+    if isinstance(datachunk, LazyDataChunk):
+        return getattr(datachunk.source, "file", None) == h5_f
+    memmap = _memmap_base(datachunk)
+    return memmap is not None and os.path.abspath(memmap.filename) == os.path.abspath(h5_f.filename)
+
+def _check_overwrite(path, record_master):
+    """Raise a ValueError if path is the record that record_master was imported from, and some of its names or
+    sequences were not imported: overwriting it with mode="w" would lose them"""
+    source = record_master._source
+    if source is None or not os.path.exists(path) or not os.path.samefile(source[0], path):
+        return
+    if source[1] != list(range(source[2])) or any(len(contig._unloaded) > 0 for contig in record_master):
+        raise ValueError("%s is the record this record_master was imported from, and the names or sequences not "
+                         "imported would be lost with mode=\"w\". Export it to another path (the names not "
+                         "imported are copied), or update it with mode=\"a\"" % path)
+
+def _iter_unloaded(record_master, seq_idx:int):
+    """Yields (name, list of DataChunk) of the names of a sequence left in its source at import, read lazily"""
+    contig = record_master[seq_idx]
+    if record_master._source is None or len(contig._unloaded) == 0:
+        return
+    path, seq_indexes, _ = record_master._source
+    with import_record(path, lazy=True, names=list(contig._unloaded), sequences=seq_indexes[seq_idx]) as source:
+        for name in contig._unloaded:
+            yield name, source[0]._data_dict[name]
+
+def _open_record_file(path, record_master, mode):
+    """Opens the h5 file to export to. The file backing a lazy record_master is reused, which is only
+    possible to update it incrementally after an import_record with writable=True."""
+    h5_lazy = record_master._h5_file
+    if h5_lazy is not None and os.path.exists(path) and os.path.samefile(h5_lazy.filename, path):
+        if mode == "w" or h5_lazy.mode == "r":
+            raise ValueError("%s is backing the lazy record_master, and can only be updated with mode=\"a\" "
+                             "after an import_record with writable=True" % path)
+        return h5_lazy, False
+    return h5py.File(path, mode=mode), True
+
+def export_record(path, record_master, compression="gzip", compression_opts=4, chunk_len=None, n_workers=None,
+                  mode="w", dtype_policy=None):
     """Export a Record_Master object to an h5 file, readable outside of this library.
 
     params:
         - path: path of the file to be saved
         - record_master: RecordMaster to save
+        - compression: Codec of the datasets, in {None, "lzf", "gzip"}
+        - compression_opts: Level of the gzip compression, from 0 to 9
+        - chunk_len: Number of timepoints of the HDF5 chunks. None for chunks of about 1MB, or
+        contiguous datasets when compression is None (that can be memory mapped by import_record).
+        - n_workers: Number of threads compressing the gzip chunks before they are written.
+        - mode: "w" to write a new file, or "a" to update incrementally the file last exported or imported
+        for this record_master. In "w" mode, the names not loaded by a selective import_record are copied from
+        the imported file, which cannot be overwritten (the names and sequences not imported would be lost).
+        In "a" mode, only the DataChunk set since then (or marked with
+        ContiguousRecord.mark_dirty) are written, the deleted names are removed, and the other datasets are
+        left untouched. Note that HDF5 does not reclaim the space of removed datasets (see h5repack).
+        - dtype_policy: Dtype policy applied to the DataChunk written, like COMPACT_DTYPE_POLICY (see
+        ContiguousRecord.set_dtype_policy). Defaults to the dtype policy of each sequence.
+
+    The content_hash of each DataChunk (without its idx) is stored in the "__hash" attribute of its dataset,
+    and reused by import_record.
+
+    A path with the ".recdir" suffix (or an existing directory) is exported to a directory store instead of an
+    h5 file, see export_record_dir.
+
+    return:
+        - pandas DataFrame of the bytes written, stored and throughput of each stream
     """
+    if mode not in ["w", "a"]:
+        raise ValueError("mode must be \"w\" or \"a\", not %s" % repr(mode))
+    if _is_dir_store(path):
+        return export_record_dir(path, record_master, compression=compression, compression_opts=compression_opts,
+                                 chunk_len=chunk_len, n_workers=n_workers, mode=mode, dtype_policy=dtype_policy)
     print("Exporting the record master")
-    with h5py.File(path, mode="w") as h5_f:
-        fr = None
-        if hasattr(record_master, '_frame_time'):
-            fr = record_master._frame_time #_frame_time was moved to Contigous_Record
-        h5_f.attrs["_sep_size"]   = record_master._sep_size
-        for i, contig in enumerate(record_master):
-            #create contig
-            print("Contiguous sequence",i)
-            cntig_ref = h5_f.create_group(str(i))
-            cntig_ref.attrs["length"] = contig.length
-            if fr is not None:
-                cntig_ref.attrs["_frame_time"] = fr
-            else:
-                cntig_ref.attrs["_frame_time"] = contig._frame_time
-            for key, dc_list in contig._data_dict.items():
-                #create datastream
-                print("...Entering stream",key)
-                stream_ref = cntig_ref.create_group(key)
-                for datachunk in dc_list:
-                    print("......",str(datachunk.idx)+"->"+str(datachunk.idx+len(datachunk)))
-                    dset = stream_ref.create_dataset(str(datachunk.idx), data=np.array(datachunk), compression="gzip", compression_opts=4)
-                    ndarray_ref = stream_ref.create_group("__ndarray_"+str(datachunk.idx))
-                    for attr_k, attr_v in datachunk.attrs.items():
-                        if isinstance(attr_v, (np.ndarray,)):
-                            ndarray_ref.create_dataset(attr_k, data=attr_v, compression="gzip", compression_opts=4)
-                        else:
-                            dset.attrs[attr_k] = json.dumps(attr_v)
-                    dset.attrs["__fill"] = datachunk.fill
-                    dset.attrs["__group"] = datachunk.group
+    stats = []
+    if mode == "w":
+        _check_overwrite(path, record_master)
+    h5_f, close_file = _open_record_file(path, record_master, mode)
+    try:
+        with ThreadPoolExecutor(n_workers) as executor:
+            if len(h5_f.keys()) > len(record_master):
+                raise ValueError("%s contains more sequences than the record_master. Use mode=\"w\" to overwrite it" % path)
+            fr = None
+            if hasattr(record_master, '_frame_time'):
+                fr = record_master._frame_time #_frame_time was moved to Contigous_Record
+            h5_f.attrs["_sep_size"]   = record_master._sep_size
+            for i, contig in enumerate(record_master):
+                #create contig
+                print("Contiguous sequence",i)
+                cntig_ref = h5_f.require_group(str(i))
+                cntig_ref.attrs["length"] = contig.length
+                if fr is not None:
+                    cntig_ref.attrs["_frame_time"] = fr
+                else:
+                    cntig_ref.attrs["_frame_time"] = contig._frame_time
+                for key in contig._deleted:
+                    if key in cntig_ref:
+                        print("...Removing stream",key)
+                        del cntig_ref[key]
+                streams = contig._data_dict.items()
+                if mode == "w": #The names not loaded at import are copied from the imported file
+                    streams = itertools.chain(streams, _iter_unloaded(record_master, i))
+                for key, dc_list in streams:
+                    if key in cntig_ref and key not in contig._dirty:
+                        continue
+                    #create datastream
+                    print("...Entering stream",key)
+                    stream_ref = cntig_ref.require_group(key)
+                    nbytes, stored_bytes, t_start = 0, 0, time.perf_counter()
+                    for datachunk in dc_list:
+                        name = str(datachunk.idx)
+                        replace = name in stream_ref
+                        if replace and (datachunk.idx not in contig._dirty[key] or _is_backed_by(datachunk, h5_f)):
+                            continue
+                        print("......",str(datachunk.idx)+"->"+str(datachunk.idx+len(datachunk)))
+                        suffix = "__tmp" if replace else "" #Written aside before replacing the previous dataset
+                        candidates = _policy_candidates(contig.dtype_policy if dtype_policy is None else dtype_policy, key,
+                                                        datachunk.group)
+                        datachunk  = _apply_dtype_policy(datachunk, candidates, cast_lazy=True)
+                        dset = _write_datachunk(stream_ref, datachunk, compression, compression_opts,
+                                                chunk_len, executor, suffix=suffix)
+                        if replace:
+                            del stream_ref[name]
+                            if "__ndarray_"+name in stream_ref:
+                                del stream_ref["__ndarray_"+name]
+                            stream_ref.move(name+suffix, name)
+                            stream_ref.move("__ndarray_"+name+suffix, "__ndarray_"+name)
+                        dset_nbytes, dset_stored = _h5_sizes(dset)
+                        nbytes       += dset_nbytes
+                        stored_bytes += dset_stored
+                    duration = time.perf_counter() - t_start
+                    print("......%.1f MB written (%.1f MB stored) at %.1f MB/s" % (nbytes/1e6, stored_bytes/1e6,
+                                                                                    nbytes/1e6/max(duration, 1e-9)))
+                    stats.append({"sequence": i, "name": key, "nbytes": nbytes, "stored_bytes": stored_bytes,
+                                  "seconds": duration, "MB/s": nbytes/1e6/max(duration, 1e-9)})
+    finally:
+        if close_file:
+            h5_f.close()
+    for contig in record_master:
+        contig.mark_clean()
     print()
-
-def import_record(path):
+    return pd.DataFrame(stats, columns=["sequence", "name", "nbytes", "stored_bytes", "seconds", "MB/s"])
+
+def _read_h5_attrs(dset, ndarray_ref=None):
+    """Read the attrs of a DataChunk saved by export_record, from its dataset and from its
+    group of ndarray attributes"""
+    attrs = {}
+    for k,v in dset.attrs.items():
+        if k not in  ["__fill", "__group", "__sparse", "__shape", "__rle", "__hash"]:
+            attrs[k] = json.loads(v)
+    if ndarray_ref is not None:
+        for k,v in ndarray_ref.items():
+            attrs[k] = _array_to_list(v) if v.attrs.get("__list", False) else v[:]
+    return attrs
+
+def _memmap_dataset(dset):
+    """Returns a read-only memmap of a contiguous and uncompressed h5py Dataset, or None if the
+    dataset cannot be memory mapped (chunked, compressed or not allocated)."""
+    if dset.chunks is not None or dset.dtype.kind not in "biufc" or dset.size==0:
+        return None
+    offset = dset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(dset.file.filename, mode="r", dtype=dset.dtype, offset=offset, shape=dset.shape)
+
+def _stream_group(ref_dstream):
+    """Returns the group of a stream saved by export_record, from the attributes of its first DataChunk"""
+    for key_dc in ref_dstream.keys():
+        if not key_dc.startswith("__ndarray_"):
+            return ref_dstream[key_dc].attrs["__group"]
+
+def import_record(path, lazy=False, names=None, groups=None, sequences=None, writable=False):
     """Import a Record_Master from an h5 file saved by the export_record function of this library.
 
     params:
         - path: path of the RecordMaster to import
+        - lazy: If True, no data is read at import. Uncompressed datasets are memory mapped, and the
+        others are imported as LazyDataChunk that read only the windows requested. The file then stays
+        open until record_master.close() is called (or the end of a with statement on the record_master).
+        - names: Name, or list of names of the data to import. None to import all names.
+        - groups: Group, or list of groups ("sync", "stim", "data", "cell") of the data to import.
+        Data matching either names or groups is imported, and "main_tp" and "signals" are always imported.
+        - sequences: Index, or list of indexes of the sequences to import. None to import all sequences.
+        - writable: If True with lazy=True, the file is kept open in read/write mode so the record_master
+        can be updated in it with export_record(path, record_master, mode="a").
+
+    Data not selected is not read, and is listed by record_master.available_keys()
+
+    A directory store written by export_record_dir is imported by import_record_dir.
     """
+    if _is_dir_store(path):
+        return import_record_dir(path, lazy=lazy, names=names, groups=groups, sequences=sequences, writable=writable)
+    if isinstance(names, str):
+        names = [names]
+    if isinstance(groups, str):
+        groups = [groups]
+    if isinstance(sequences, (int, np.integer)):
+        sequences = [sequences]
     print("Importing the record master")
-    with h5py.File(path, mode="r") as h5_f:
+    h5_f = h5py.File(path, mode="r+" if (lazy and writable) else "r")
+    try:
         record_master    = None
         frame_rate = None
         reg         = re.compile("frame_time")
@@ -625,32 +2045,49 @@ def import_record(path):
         if len(fr_time_key)==1:
             frame_rate = round(1/h5_f.attrs[fr_time_key[0]])
         keys = sorted(h5_f.keys(), key=int)
+        if sequences is not None:
+            keys = [key for key in keys if int(key) in sequences]
         for j, key_contig in enumerate(keys):
             ref_contig = h5_f[key_contig]
             stream_d   = {}
-            keys = sorted(h5_f.keys(), key=int)
+            unloaded_d = {}
             for i, key_dstream in enumerate(ref_contig.keys()):
                 ref_dstream = ref_contig[key_dstream]
+                if not (key_dstream in ["main_tp", "signals"]
+                        or (names is None and groups is None)
+                        or (names is not None and key_dstream in names)
+                        or (groups is not None and _stream_group(ref_dstream) in groups)):
+                    unloaded_d[key_dstream] = _stream_group(ref_dstream)
+                    continue
                 dchunk_l = []
                 for key_dc in ref_dstream.keys():
                     if key_dc.startswith("__ndarray_"): #skipping array attributes for later
                         continue
-                    data = ref_dstream[key_dc]
-                    idx  = int(key_dc)
-                    attrs = {}
-                    for k,v in data.attrs.items():
-                        if k not in  ["__fill", "__group"]:
-                            attrs[k] = json.loads(v)
-                        elif k == "__fill":
-                            fill = v
-                        elif k == "__group":
-                            group = v
-                    if "__ndarray_"+str(idx) in ref_dstream.keys():
-                        # if condition for backward support
-                        for k,v in ref_dstream["__ndarray_"+str(idx)].items():
-                            attrs[k] = v[:]
-                    dchunk = DataChunk(data=data[:], idx=idx, group=group)
-                    dchunk.attrs = attrs
+                    data  = ref_dstream[key_dc]
+                    idx   = int(key_dc)
+                    fill  = np.asarray(data.attrs.get("__fill", 0)).item() #numpy scalars would promote the dtype
+                    group = data.attrs["__group"]
+                    ndarray_ref = ref_dstream.get("__ndarray_"+str(idx)) # None for backward support
+                    if data.attrs.get("__sparse") == "csr": #Small enough to always be read
+                        csr    = sparse.csr_matrix((data["data"][:], data["indices"][:], data["indptr"][:]),
+                                                   shape=tuple(data.attrs["__shape"]))
+                        dchunk = SparseDataChunk(csr, idx=idx, group=group)
+                        dchunk.attrs = _read_h5_attrs(data, ndarray_ref)
+                    elif data.attrs.get("__rle") == "frames":
+                        frames = data["frames"] if lazy else data["frames"][:]
+                        dchunk = RLEDataChunk(frames, data["repeats"][:], idx=idx, group=group, fill=fill)
+                        dchunk.attrs = _read_h5_attrs(data, ndarray_ref)
+                    elif not lazy:
+                        dchunk = DataChunk(data=data[:], idx=idx, group=group, fill=fill)
+                        dchunk.attrs = _read_h5_attrs(data, ndarray_ref)
+                    elif _memmap_dataset(data) is not None:
+                        dchunk = DataChunk(data=_memmap_dataset(data), idx=idx, group=group, fill=fill)
+                        dchunk.attrs = _read_h5_attrs(data, ndarray_ref)
+                    else:
+                        dchunk = LazyDataChunk(data, idx=idx, group=group, fill=fill,
+                                               attrs_loader=partial(_read_h5_attrs, data, ndarray_ref))
+                    if "__hash" in data.attrs: #The hash computed at export is trusted for read-only data
+                        _seed_hash(dchunk, data.attrs["__hash"])
                     dchunk_l.append(dchunk)
 
                 stream_d[key_dstream] = dchunk_l
@@ -665,5 +2102,499 @@ def import_record(path):
                     if kstream in ["main_tp", "signals"] and k==0:
                         continue
                     record_master.set_datachunk(dc, name=kstream, sequence_idx=j)
+            record_master[j]._unloaded = unloaded_d
+            record_master[j].mark_clean()
+    except Exception:
+        h5_f.close()
+        raise
+    record_master._source = (os.path.abspath(path), [int(key) for key in keys], len(h5_f.keys()))
+    if lazy:
+        record_master._h5_file = h5_f
+    else:
+        h5_f.close()
+    print()
+    return record_master
+
+# Cell
+_DIR_STORE_MANIFEST = "manifest.json"
+_DIR_STORE_SUFFIX   = ".recdir"
+
+def _is_dir_store(path) -> bool:
+    """Check if a record path is a directory store: an existing directory, or a path with the ".recdir" suffix.
+    Other paths (with or without file extension) are h5 files."""
+    path = os.fspath(path)
+    return os.path.isdir(path) or path.rstrip(os.sep).endswith(_DIR_STORE_SUFFIX)
+
+class _ZChunkSource():
+    """Array-like of a DataChunk stored as blocks of block_len timepoints compressed independently with zlib
+    in a file. Reading a window only decompresses the blocks it overlaps."""
+    def __init__(self, filename:str, shape:tuple, dtype, block_len:int, offsets:list):
+        self.filename  = filename
+        self.block_len = block_len
+        self.offsets   = offsets
+        self._shape    = tuple(shape)
+        self._dtype    = np.dtype(dtype)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def _read_blocks(self, first:int, last:int) -> np.ndarray:
+        """Decompress the blocks from first to last included"""
+        with open(self.filename, "rb") as f:
+            f.seek(self.offsets[first])
+            raw = f.read(self.offsets[last+1] - self.offsets[first])
+        bounds = [offset - self.offsets[first] for offset in self.offsets[first:last+2]]
+        data   = bytearray(b"".join(zlib.decompress(raw[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])))
+        return np.frombuffer(data, dtype=self._dtype).reshape((-1, *self._shape[1:]))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            if stop <= start:
+                return np.empty((0, *self._shape[1:]), dtype=self._dtype)
+            first, last = start // self.block_len, (stop-1) // self.block_len
+            return self._read_blocks(first, last)[start - first*self.block_len:stop - first*self.block_len]
+        return self[:][key]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def __len__(self):
+        return self._shape[0]
+
+def _write_json(filename:str, obj):
+    """Write obj as json in filename, atomically"""
+    with open(filename + ".tmp", "w") as f:
+        json.dump(obj, f)
+    os.replace(filename + ".tmp", filename)
+
+def _write_npz(filename:str, compressed:bool, **arrays):
+    """Write arrays in a npz file, atomically"""
+    with open(filename + ".tmp", "wb") as f:
+        (np.savez_compressed if compressed else np.savez)(f, **arrays)
+    os.replace(filename + ".tmp", filename)
+
+def _write_npy(filename:str, data, chunk_len:int):
+    """Write an array-like of shape (t, ...) in a .npy file by blocks of chunk_len timepoints, atomically"""
+    shape, dtype = tuple(data.shape), np.dtype(data.dtype)
+    if np.prod(shape)==0 or dtype.kind not in "biufcSU":
+        with open(filename + ".tmp", "wb") as f:
+            np.save(f, np.asarray(data), allow_pickle=False)
+    else:
+        memmap = np.lib.format.open_memmap(filename + ".tmp", mode="w+", dtype=dtype, shape=shape)
+        for start in range(0, shape[0], chunk_len):
+            memmap[start:start+chunk_len] = data[start:start+chunk_len]
+        memmap.flush()
+        del memmap
+    os.replace(filename + ".tmp", filename)
+
+def _write_zchunks(filename:str, data, chunk_len:int, level:int, executor) -> list:
+    """Write an array-like of shape (t, ...) as blocks of chunk_len timepoints compressed in the executor threads,
+    atomically, and returns the offsets of the blocks in the file"""
+    dtype   = np.dtype(data.dtype)
+    starts  = range(0, len(data), chunk_len)
+    offsets = [0]
+    def compress_block(start):
+        return zlib.compress(np.ascontiguousarray(np.asarray(data[start:start+chunk_len], dtype=dtype)).tobytes(), level)
+
+    batch_size = 4 * getattr(executor, "_max_workers", 1) #Bounds the compressed blocks held in memory
+    with open(filename + ".tmp", "wb") as f:
+        for i in range(0, len(starts), batch_size):
+            for compressed in executor.map(compress_block, starts[i:i+batch_size]):
+                f.write(compressed)
+                offsets.append(offsets[-1] + len(compressed))
+    os.replace(filename + ".tmp", filename)
+    return offsets
+
+_DIR_STORE_SUFFIXES = [".npy", ".zc", ".sparse.npz", ".rle.npz", ".attrs.npz"]
+
+def _write_datachunk_dir(stream_dir:str, datachunk, compression, compression_opts, chunk_len, executor) -> tuple:
+    """Write a DataChunk in the directory of its stream as a data file and a json file of its metadata, written last
+    so a DataChunk is only visible once complete. Returns the bytes of the data and the bytes stored."""
+    base  = os.path.join(stream_dir, str(datachunk.idx))
+    shape = tuple(int(dim) for dim in datachunk.shape)
+    meta  = {"idx": int(datachunk.idx), "group": datachunk.group, "fill": np.asarray(datachunk.fill).item(),
+             "shape": shape, "dtype": np.dtype(datachunk.dtype).str,
+             "hash": content_hash(datachunk, include_idx=False, refresh=_is_writeable(datachunk)),
+             "attrs": {}, "array_attrs": []}
+    if chunk_len is None: #About 1MB per block
+        chunk_len = (1<<20) // max(1, int(np.prod(shape[1:])) * np.dtype(datachunk.dtype).itemsize)
+    chunk_len = int(max(1, chunk_len))
+    if isinstance(datachunk, SparseDataChunk):
+        meta["kind"] = "sparse"
+        csr = datachunk.tocsr()
+        _write_npz(base + ".sparse.npz", compression is not None, data=csr.data, indices=csr.indices, indptr=csr.indptr)
+    elif isinstance(datachunk, RLEDataChunk):
+        meta["kind"] = "rle"
+        _write_npz(base + ".rle.npz", compression is not None, frames=np.asarray(datachunk.frames),
+                   repeats=datachunk.repeats)
+    elif compression is None:
+        meta["kind"] = "npy"
+        _write_npy(base + ".npy", datachunk, chunk_len)
+    else:
+        meta["kind"] = "zchunks"
+        meta["block_len"] = chunk_len
+        meta["offsets"]   = _write_zchunks(base + ".zc", datachunk, chunk_len,
+                                           4 if compression_opts is None else compression_opts, executor)
+    array_attrs = {key: value for key, value in datachunk.attrs.items() if isinstance(value, np.ndarray)}
+    if len(array_attrs) > 0:
+        _write_npz(base + ".attrs.npz", False, **array_attrs)
+    meta["array_attrs"] = sorted(array_attrs.keys())
+    meta["attrs"] = {key: value for key, value in datachunk.attrs.items() if key not in array_attrs}
+    _write_json(base + ".json", meta)
+
+    written = {".npy": "npy", ".zc": "zchunks", ".sparse.npz": "sparse", ".rle.npz": "rle"}
+    stored_bytes = 0
+    for suffix in _DIR_STORE_SUFFIXES + [".json"]:
+        filename = base + suffix
+        if suffix in written and written[suffix] != meta["kind"] or suffix == ".attrs.npz" and not array_attrs:
+            if os.path.exists(filename): #Left by a previous DataChunk of another kind at the same idx
+                os.remove(filename)
+        elif os.path.exists(filename):
+            stored_bytes += os.path.getsize(filename)
+    return int(np.prod(shape)) * np.dtype(datachunk.dtype).itemsize, stored_bytes
+
+def _read_datachunk_dir(stream_dir:str, meta:dict, lazy:bool, writable:bool):
+    """Read a DataChunk written by _write_datachunk_dir from its metadata"""
+    base = os.path.join(stream_dir, str(meta["idx"]))
+    idx, group, fill = meta["idx"], meta["group"], np.asarray(meta["fill"]).item()
+    if meta["kind"] == "sparse":
+        with np.load(base + ".sparse.npz") as npz:
+            csr = sparse.csr_matrix((npz["data"], npz["indices"], npz["indptr"]), shape=tuple(meta["shape"]))
+        dchunk = SparseDataChunk(csr, idx=idx, group=group)
+    elif meta["kind"] == "rle":
+        with np.load(base + ".rle.npz") as npz:
+            dchunk = RLEDataChunk(npz["frames"], npz["repeats"], idx=idx, group=group, fill=fill)
+    elif meta["kind"] == "npy":
+        mmap_mode = ("r+" if writable else "r") if lazy and np.prod(meta["shape"]) > 0 else None
+        dchunk = DataChunk(np.load(base + ".npy", mmap_mode=mmap_mode), idx=idx, group=group, fill=fill)
+    else:
+        source = _ZChunkSource(base + ".zc", meta["shape"], meta["dtype"], meta["block_len"], meta["offsets"])
+        if lazy:
+            dchunk = LazyDataChunk(source, idx=idx, group=group, fill=fill)
+        else:
+            dchunk = DataChunk(np.asarray(source), idx=idx, group=group, fill=fill)
+    attrs = dict(meta["attrs"])
+    if len(meta["array_attrs"]) > 0:
+        with np.load(base + ".attrs.npz") as npz:
+            attrs.update({key: npz[key] for key in meta["array_attrs"]})
+    dchunk.attrs = attrs
+    _seed_hash(dchunk, meta["hash"])
+    return dchunk
+
+def _read_stream_metas(stream_dir:str) -> list:
+    """Returns the metadata of the complete DataChunk of a stream directory, sorted by idx"""
+    metas = []
+    for filename in os.listdir(stream_dir):
+        if filename.endswith(".json"):
+            with open(os.path.join(stream_dir, filename)) as f:
+                metas.append(json.load(f))
+    return sorted(metas, key=lambda meta: meta["idx"])
+
+# Cell
+def export_datachunk(path, datachunk, name:str, sequence_idx:int=0, compression=None, compression_opts=4, chunk_len=None):
+    """Write a single DataChunk under name in a sequence of a directory store, next to the DataChunk already there.
+    Each DataChunk is written in its own files, so different DataChunk can be written concurrently by multiple
+    processes (e.g. synchronisation workers of different streams). The sequence must be in the manifest of the
+    store, written by export_record_dir.
+
+    params:
+        - path: Path of the directory store
+        - datachunk: DataChunk to write (or SparseDataChunk, RLEDataChunk, LazyDataChunk)
+        - name: Name of the data
+        - sequence_idx: Index of the sequence
+        - compression, compression_opts, chunk_len: See export_record_dir
+    """
+    stream_dir = os.path.join(os.fspath(path), str(sequence_idx), name)
+    os.makedirs(stream_dir, exist_ok=True)
+    with ThreadPoolExecutor(1) as executor:
+        return _write_datachunk_dir(stream_dir, datachunk, compression, compression_opts, chunk_len, executor)
+
+def export_record_dir(path, record_master, compression="gzip", compression_opts=4, chunk_len=None, n_workers=None,
+                      mode="w", dtype_policy=None):
+    """Export a RecordMaster to a directory store: a "manifest.json" file of the sequences, and a directory per
+    sequence and per name holding the files of each DataChunk. Uncompressed DataChunk are written as .npy files,
+    that are memory mapped by import_record_dir with lazy=True. Compressed DataChunk are written as blocks of
+    chunk_len timepoints compressed independently with zlib, so reading a window only decompresses the blocks it
+    overlaps. Sparse and run-length encoded DataChunk are written as npz files of their arrays.
+
+    Called by export_record for a path with the ".recdir" suffix. Use convert_record to convert a record between
+    the h5 and directory formats.
+
+    params:
+        - path: path of the directory to be saved
+        - record_master: RecordMaster to save
+        - compression: None for .npy files, or any other value for zlib compressed blocks
+        - compression_opts: Level of the zlib compression, from 0 to 9
+        - chunk_len: Number of timepoints of the compressed blocks, None for blocks of about 1MB
+        - n_workers: Number of threads compressing the blocks before they are written
+        - mode: "w" to write a new store, or "a" to only write the DataChunk set since the last export or import
+        (see export_record)
+        - dtype_policy: Dtype policy applied to the DataChunk written (see export_record)
+
+    return:
+        - pandas DataFrame of the bytes written, stored and throughput of each stream
+    """
+    if mode not in ["w", "a"]:
+        raise ValueError("mode must be \"w\" or \"a\", not %s" % repr(mode))
+    path = os.fspath(path)
+    manifest_path = os.path.join(path, _DIR_STORE_MANIFEST)
+    if os.path.isdir(path) and len(os.listdir(path)) > 0 and not os.path.isfile(manifest_path):
+        raise ValueError("%s is not empty and is not a record directory" % path)
+    dir_lazy = record_master._dir_store
+    if mode == "w" and dir_lazy is not None and os.path.isdir(path) and os.path.samefile(dir_lazy, path):
+        raise ValueError("%s is backing the lazy record_master, and can only be updated with mode=\"a\"" % path)
+    if mode == "a" and os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            if len(json.load(f)["sequences"]) > len(record_master):
+                raise ValueError("%s contains more sequences than the record_master. Use mode=\"w\" to overwrite it" % path)
+    elif mode == "w" and os.path.isdir(path):
+        _check_overwrite(path, record_master)
+        for entry in os.listdir(path):
+            if os.path.isdir(os.path.join(path, entry)):
+                shutil.rmtree(os.path.join(path, entry))
+    os.makedirs(path, exist_ok=True)
+
+    print("Exporting the record master")
+    stats, sequences = [], []
+    with ThreadPoolExecutor(n_workers) as executor:
+        for i, contig in enumerate(record_master):
+            print("Contiguous sequence",i)
+            seq_dir = os.path.join(path, str(i))
+            os.makedirs(seq_dir, exist_ok=True)
+            for key in contig._deleted:
+                if os.path.isdir(os.path.join(seq_dir, key)):
+                    print("...Removing stream",key)
+                    shutil.rmtree(os.path.join(seq_dir, key))
+            streams = contig._data_dict.items()
+            if mode == "w": #The names not loaded at import are copied from the imported record
+                streams = itertools.chain(streams, _iter_unloaded(record_master, i))
+            for key, dc_list in streams:
+                stream_dir = os.path.join(seq_dir, key)
+                if os.path.isdir(stream_dir) and key not in contig._dirty:
+                    continue
+                print("...Entering stream",key)
+                os.makedirs(stream_dir, exist_ok=True)
+                nbytes, stored_bytes, t_start = 0, 0, time.perf_counter()
+                for datachunk in dc_list:
+                    if (os.path.isfile(os.path.join(stream_dir, str(datachunk.idx)+".json"))
+                        and datachunk.idx not in contig._dirty[key]):
+                        continue
+                    print("......",str(datachunk.idx)+"->"+str(datachunk.idx+len(datachunk)))
+                    candidates = _policy_candidates(contig.dtype_policy if dtype_policy is None else dtype_policy, key,
+                                                    datachunk.group)
+                    datachunk  = _apply_dtype_policy(datachunk, candidates, cast_lazy=True)
+                    dc_nbytes, dc_stored = _write_datachunk_dir(stream_dir, datachunk, compression, compression_opts,
+                                                                chunk_len, executor)
+                    nbytes       += dc_nbytes
+                    stored_bytes += dc_stored
+                duration = time.perf_counter() - t_start
+                print("......%.1f MB written (%.1f MB stored) at %.1f MB/s" % (nbytes/1e6, stored_bytes/1e6,
+                                                                                nbytes/1e6/max(duration, 1e-9)))
+                stats.append({"sequence": i, "name": key, "nbytes": nbytes, "stored_bytes": stored_bytes,
+                              "seconds": duration, "MB/s": nbytes/1e6/max(duration, 1e-9)})
+            sequences.append({"length": contig.length, "_frame_time": contig._frame_time})
+    _write_json(manifest_path, {"format": "theonerig", "version": 1, "_sep_size": record_master._sep_size,
+                                "sequences": sequences})
+    for contig in record_master:
+        contig.mark_clean()
+    print()
+    return pd.DataFrame(stats, columns=["sequence", "name", "nbytes", "stored_bytes", "seconds", "MB/s"])
+
+def import_record_dir(path, lazy=False, names=None, groups=None, sequences=None, writable=False):
+    """Import a RecordMaster from a directory store saved by export_record_dir. Called by import_record
+    for a directory (or a path with the ".recdir" suffix).
+
+    params:
+        - path: path of the directory store
+        - lazy: If True, the .npy files are memory mapped and the compressed DataChunk are imported as
+        LazyDataChunk that only decompress the blocks of the windows requested.
+        - names, groups, sequences: Selection of the data to import, see import_record
+        - writable: If True with lazy=True, the .npy files are memory mapped in read/write mode
+    """
+    if isinstance(names, str):
+        names = [names]
+    if isinstance(groups, str):
+        groups = [groups]
+    if isinstance(sequences, (int, np.integer)):
+        sequences = [sequences]
+    path = os.fspath(path)
+    with open(os.path.join(path, _DIR_STORE_MANIFEST)) as f:
+        manifest = json.load(f)
+    print("Importing the record master")
+    record_master = None
+    seq_indexes   = [i for i in range(len(manifest["sequences"])) if sequences is None or i in sequences]
+    for j, i in enumerate(seq_indexes):
+        seq_dir    = os.path.join(path, str(i))
+        stream_d   = {}
+        unloaded_d = {}
+        for key_dstream in sorted(os.listdir(seq_dir)):
+            stream_dir = os.path.join(seq_dir, key_dstream)
+            metas      = _read_stream_metas(stream_dir)
+            if len(metas) == 0:
+                continue
+            if not (key_dstream in ["main_tp", "signals"]
+                    or (names is None and groups is None)
+                    or (names is not None and key_dstream in names)
+                    or (groups is not None and metas[0]["group"] in groups)):
+                unloaded_d[key_dstream] = metas[0]["group"]
+                continue
+            stream_d[key_dstream] = [_read_datachunk_dir(stream_dir, meta, lazy, writable) for meta in metas]
+        frame_rate = round(1/manifest["sequences"][i]["_frame_time"])
+        if record_master is None:
+            record_master = RecordMaster([(stream_d["main_tp"][0],stream_d["signals"][0])], frame_rate=frame_rate)
+        else:
+            record_master.append(stream_d["main_tp"][0],stream_d["signals"][0], frame_rate=frame_rate)
+        for kstream, vstream in stream_d.items():
+            for k, dc in enumerate(vstream):
+                if kstream in ["main_tp", "signals"] and k==0:
+                    continue
+                record_master.set_datachunk(dc, name=kstream, sequence_idx=j)
+        record_master[j]._unloaded = unloaded_d
+        record_master[j].mark_clean()
+    record_master._sep_size = manifest["_sep_size"]
+    record_master._source   = (os.path.abspath(path), seq_indexes, len(manifest["sequences"]))
+    if lazy:
+        record_master._dir_store = path
+    print()
+    return record_master
+
+def convert_record(src_path, dst_path, **export_kwargs):
+    """Convert a record between the h5 file and the directory store formats, each chosen by its path (see
+    export_record). The source is imported lazily and copied by blocks, so it is never loaded whole.
+
+    params:
+        - src_path: Path of the record to convert
+        - dst_path: Path of the converted record
+        - export_kwargs: Parameters of export_record, e.g. compression=None for a memory mappable directory store
+
+    return:
+        - pandas DataFrame of the bytes written, see export_record
+    """
+    with import_record(src_path, lazy=True) as record_master:
+        return export_record(dst_path, record_master, **export_kwargs)
+
+# Cell
+class _SourceWindow():
+    """Window [start, stop) along time of an array-like source, only read when sliced"""
+    def __init__(self, source, start:int, stop:int):
+        self.source = source
+        self.start  = start
+        self.stop   = stop
+
+    @property
+    def shape(self):
+        return (self.stop - self.start, *self.source.shape[1:])
+
+    @property
+    def dtype(self):
+        return np.dtype(self.source.dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            return self.source[self.start+start:self.start+max(start, stop)]
+        return np.asarray(self.source[self.start:self.stop])[key]
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.asarray(self.source[self.start:self.stop])
+        return data if dtype is None else data.astype(dtype)
+
+    def __len__(self):
+        return self.stop - self.start
+
+def _crop_datachunk(datachunk, start:int, stop:int, idx:int):
+    """Returns the window [start, stop) of a DataChunk (relative to its beginning) as a DataChunk of the same
+    kind starting at idx, without reading the data of lazy, memory mapped or run-length encoded DataChunk"""
+    if isinstance(datachunk, SparseDataChunk):
+        cropped = SparseDataChunk(datachunk.read_sparse(start, stop), idx, datachunk.group)
+    elif isinstance(datachunk, RLEDataChunk):
+        first   = np.searchsorted(datachunk._run_stops, start, side="right")
+        last    = np.searchsorted(datachunk._run_stops, stop-1, side="right")
+        repeats = (np.minimum(datachunk._run_stops[first:last+1], stop)
+                   - np.maximum(datachunk._run_starts[first:last+1], start))
+        cropped = RLEDataChunk(_SourceWindow(datachunk.frames, first, last+1), repeats, idx,
+                               datachunk.group, datachunk.fill)
+    elif isinstance(datachunk, LazyDataChunk):
+        cropped = LazyDataChunk(_SourceWindow(datachunk.source, start, stop), idx, datachunk.group, datachunk.fill)
+    else:
+        cropped     = datachunk[start:stop]
+        cropped.idx = idx
+    cropped.attrs = dict(datachunk.attrs)
+    return cropped
+
+def export_subset(path, data_pipe, names=None, compression="gzip", compression_opts=4, chunk_len=None,
+                  n_workers=None, dtype_policy=None):
+    """Export the data of the slices of a Data_Pipe to a new h5 file, readable with import_record. Each slice
+    becomes a sequence of the new record, with its indexes re-based to the start of the slice, and with its
+    "main_tp" and "signals" cropped to the slice. The data is copied by DataChunk and by blocks, so a lazy
+    or memory mapped record_master is never loaded whole.
+
+    The sequence of the source record and the start of each slice are stored in the "_source_sequence" and
+    "_source_start" attributes of the h5 group of the new sequences.
+
+    params:
+        - path: path of the file to be saved
+        - data_pipe: Data_Pipe whose slices are exported
+        - names: Name, group, or list of names and groups of the data to export. Defaults to
+        data_pipe.data_names. "main_tp" and "signals" are always exported.
+        - compression, compression_opts, chunk_len, n_workers: See export_record
+        - dtype_policy: Dtype policy applied to the DataChunk written. Defaults to the dtype policy of
+        each source sequence.
+
+    return:
+        - pandas DataFrame of the bytes written, stored and throughput of each stream
+    """
+    if names is None:
+        names = data_pipe.data_names
+    if isinstance(names, str):
+        names = [names]
+    record_master = data_pipe.record_master
+    print("Exporting a subset of the record master")
+    stats = []
+    with h5py.File(path, mode="w") as h5_f, ThreadPoolExecutor(n_workers) as executor:
+        h5_f.attrs["_sep_size"] = record_master._sep_size
+        for i, (seq_idx, _slice) in enumerate(data_pipe._slices):
+            seq = record_master[seq_idx]
+            start, stop = _slice.start, _slice.stop
+            print("Contiguous sequence",i,"from sequence",seq_idx,"["+str(start)+"->"+str(stop)+")")
+            cntig_ref = h5_f.create_group(str(i))
+            cntig_ref.attrs["length"]           = stop - start
+            cntig_ref.attrs["_frame_time"]      = seq._frame_time
+            cntig_ref.attrs["_source_sequence"] = seq_idx
+            cntig_ref.attrs["_source_start"]    = start
+
+            seq_names = [ContiguousRecord.MAIN_TP, ContiguousRecord.SIGNALS]
+            for name in names:
+                for seq_name in (seq.get_names_group(name) if name in ["sync", "cell", "data", "stim"] else [name]):
+                    if seq_name in seq.keys() and seq_name not in seq_names:
+                        seq_names.append(seq_name)
+            for key in seq_names:
+                overlapping = seq.get_index(key).query(start, stop)
+                if len(overlapping) == 0:
+                    continue
+                print("...Entering stream",key)
+                stream_ref = cntig_ref.create_group(key)
+                nbytes, stored_bytes, t_start = 0, 0, time.perf_counter()
+                for datachunk in overlapping:
+                    dc_start = max(start, datachunk.idx)
+                    dc_stop  = min(stop, datachunk.idx + len(datachunk))
+                    cropped  = _crop_datachunk(datachunk, dc_start-datachunk.idx, dc_stop-datachunk.idx, dc_start-start)
+                    candidates = _policy_candidates(seq.dtype_policy if dtype_policy is None else dtype_policy, key,
+                                                    cropped.group)
+                    cropped    = _apply_dtype_policy(cropped, candidates, cast_lazy=True)
+                    dset = _write_datachunk(stream_ref, cropped, compression, compression_opts, chunk_len, executor)
+                    dset_nbytes, dset_stored = _h5_sizes(dset)
+                    nbytes       += dset_nbytes
+                    stored_bytes += dset_stored
+                duration = time.perf_counter() - t_start
+                stats.append({"sequence": i, "name": key, "nbytes": nbytes, "stored_bytes": stored_bytes,
+                              "seconds": duration, "MB/s": nbytes/1e6/max(duration, 1e-9)})
     print()
-    return record_master
\ No newline at end of file
+    return pd.DataFrame(stats, columns=["sequence", "name", "nbytes", "stored_bytes", "seconds", "MB/s"])
\ No newline at end of file
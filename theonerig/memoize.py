@@ -0,0 +1,210 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: 07_memoize.ipynb (unless otherwise specified).
+
+__all__ = ['input_hash', 'ResultCache']
+
+# Cell
+import os, glob, json, hashlib, inspect, functools
+from functools import partial
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .core import *
+
+# Cell
+def input_hash(obj) -> str:
+    """Returns a hash of the content of an input of an analysis: DataChunk (see content_hash), ndarray,
+    scipy.sparse matrix, number, string, None, or list, tuple and dict of those. Raises a TypeError for
+    other objects."""
+    hasher = hashlib.blake2b(digest_size=16)
+    _update_hash(hasher, obj)
+    return hasher.hexdigest()
+
+def _update_hash(hasher, obj):
+    if isinstance(obj, (DataChunk, LazyDataChunk)):
+        #The hash cached on writeable data may be stale (modified in place), so it is recomputed
+        writeable = isinstance(obj, np.ndarray) and obj.flags.writeable
+        hasher.update(("datachunk:" + content_hash(obj, refresh=writeable)).encode())
+    elif isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "O":
+            raise TypeError("Cannot hash an array of objects")
+        hasher.update(("ndarray:%s%s" % (obj.dtype.str, obj.shape)).encode())
+        hasher.update(np.ascontiguousarray(obj))
+    elif sparse.issparse(obj):
+        csr = obj.tocsr(copy=True)
+        csr.sum_duplicates()
+        hasher.update(("sparse:%s" % (csr.shape,)).encode())
+        for array in [csr.data, csr.indices, csr.indptr]:
+            _update_hash(hasher, array)
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(("%s:%d" % (type(obj).__name__, len(obj))).encode())
+        for item in obj:
+            _update_hash(hasher, item)
+    elif isinstance(obj, dict):
+        hasher.update(("dict:%d" % len(obj)).encode())
+        for key in sorted(obj.keys(), key=repr):
+            _update_hash(hasher, key)
+            _update_hash(hasher, obj[key])
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        hasher.update(("%s:%r" % (type(obj).__name__, obj)).encode())
+    else:
+        raise TypeError("Cannot hash an input of type %s" % type(obj).__name__)
+
+# Cell
+def _to_spec(obj, arrays:list):
+    """Returns the json description of a result, appending its arrays to arrays. Raises a TypeError
+    for results that cannot be stored without pickle."""
+    if isinstance(obj, DataChunk):
+        return {"datachunk": _to_spec(np.asarray(obj), arrays), "idx": int(obj.idx), "group": obj.group,
+                "fill": _to_spec(obj.fill, arrays), "attrs": _to_spec(obj.attrs, arrays)}
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        if obj.dtype.kind == "O":
+            raise TypeError("Cannot store an array of objects")
+        arrays.append(np.asarray(obj))
+        return {"array": len(arrays)-1, "scalar": isinstance(obj, np.generic)}
+    elif isinstance(obj, (list, tuple)):
+        return {type(obj).__name__: [_to_spec(item, arrays) for item in obj]}
+    elif isinstance(obj, dict):
+        return {"dict": [[_to_spec(key, arrays), _to_spec(value, arrays)] for key, value in obj.items()]}
+    elif obj is None or isinstance(obj, (bool, int, float, str)):
+        return {"value": obj}
+    raise TypeError("Cannot store a result of type %s" % type(obj).__name__)
+
+def _from_spec(spec:dict, arrays:list):
+    """Rebuild a result from its json description and its arrays"""
+    if "datachunk" in spec:
+        datachunk = DataChunk(_from_spec(spec["datachunk"], arrays), spec["idx"], spec["group"],
+                              _from_spec(spec["fill"], arrays))
+        datachunk.attrs = _from_spec(spec["attrs"], arrays)
+        return datachunk
+    elif "array" in spec:
+        array = arrays[spec["array"]]
+        return array[()] if spec["scalar"] else array
+    elif "list" in spec:
+        return [_from_spec(item, arrays) for item in spec["list"]]
+    elif "tuple" in spec:
+        return tuple(_from_spec(item, arrays) for item in spec["tuple"])
+    elif "dict" in spec:
+        return {_from_spec(key, arrays): _from_spec(value, arrays) for key, value in spec["dict"]}
+    return spec["value"]
+
+# Cell
+class ResultCache():
+    """On-disk cache of the results of functions, keyed on the content of their inputs (see input_hash) and on
+    their source code. Results made of arrays, numbers, strings, DataChunk, lists, tuples and dicts are stored
+    as npz files in cache_dir, and the least recently used are evicted when the cache grows over max_bytes.
+
+    A ResultCache decorates a function definition, or wraps an existing function:
+
+        cache = ResultCache("~/theonerig_cache", max_bytes=10*2**30)
+        cached_sta_batch = cache(process_sta_batch)
+
+        @cache(ignore=["verbose"])
+        def my_analysis(spike_counts, stim, verbose=False):
+            ...
+
+    Calls whose inputs or result cannot be hashed or stored are run without caching. The hits and misses of each
+    function are counted in self.stats and summarized by self.report().
+
+    params:
+        - cache_dir: Directory of the cached results, created if needed
+        - max_bytes: Maximum bytes of the cached results
+    """
+    def __init__(self, cache_dir:str, max_bytes:int=2**30):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats     = {} #function name -> {"hits", "misses", "uncached"}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __call__(self, func=None, ignore:list=()):
+        """Returns func wrapped by the cache. ignore lists the parameters not taking part in the key."""
+        if func is None:
+            return partial(self.__call__, ignore=ignore)
+        name      = func.__module__ + "." + func.__qualname__
+        signature = inspect.signature(func)
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = ""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = self.stats.setdefault(name, {"hits": 0, "misses": 0, "uncached": 0})
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {key: value for key, value in bound.arguments.items() if key not in ignore}
+            try:
+                key = input_hash([name, source, arguments])
+            except TypeError:
+                stats["uncached"] += 1
+                return func(*args, **kwargs)
+
+            path = os.path.join(self.cache_dir, key + ".npz")
+            try:
+                result = self._load(path)
+                os.utime(path) #Marks it as recently used
+                stats["hits"] += 1
+                return result
+            except (OSError, ValueError, KeyError):
+                pass
+
+            stats["misses"] += 1
+            result = func(*args, **kwargs)
+            try:
+                self._save(path, result)
+            except TypeError:
+                stats["uncached"] += 1
+            return result
+        wrapper.cache = self
+        return wrapper
+
+    def _load(self, path:str):
+        with np.load(path, allow_pickle=False) as npz:
+            spec   = json.loads(str(npz["__spec__"]))
+            arrays = [npz["a%d" % i] for i in range(len(npz.files)-1)]
+        return _from_spec(spec, arrays)
+
+    def _save(self, path:str, result):
+        arrays = []
+        spec   = _to_spec(result, arrays)
+        tmp_path = path + ".tmp%d" % os.getpid()
+        with open(tmp_path, "wb") as f:
+            np.savez(f, __spec__=json.dumps(spec), **{"a%d" % i: array for i, array in enumerate(arrays)})
+        os.replace(tmp_path, path) #Atomic, concurrent sessions never read a partial file
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used results until the cache is under max_bytes"""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.npz")):
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the results in the cache directory"""
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.cache_dir, "*.npz")))
+
+    def report(self) -> pd.DataFrame:
+        """Returns the hits, misses, uncached calls and hit rate of each function"""
+        report = pd.DataFrame([dict(function=name, **stats) for name, stats in self.stats.items()],
+                              columns=["function", "hits", "misses", "uncached"])
+        report["hit_rate"] = report["hits"] / (report["hits"] + report["misses"]).clip(lower=1)
+        return report
+
+    def clear(self):
+        """Remove all the results of the cache directory and reset the statistics"""
+        for path in glob.glob(os.path.join(self.cache_dir, "*.npz")):
+            os.remove(path)
+        self.stats = {}
\ No newline at end of file
@@ -0,0 +1,269 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: 09_parallel.ipynb (unless otherwise specified).
+
+__all__ = ['run_batch', 'SharedDataChunk', 'SharedRecord']
+
+# Cell
+import os, io, time, shutil, tempfile, traceback, contextlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .core import *
+
+# Cell
+def _run_record(path:str, func, lazy:bool, import_kwargs:dict, func_kwargs:dict, verbose:bool) -> tuple:
+    """Import a record and run func on it in a worker. Returns the result, the error and the duration."""
+    t_start = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            record_master = stack.enter_context(import_record(path, lazy=lazy, **import_kwargs))
+            result = func(record_master, **func_kwargs)
+        return result, None, time.perf_counter() - t_start
+    except Exception:
+        return None, traceback.format_exc(), time.perf_counter() - t_start
+
+def _record_nbytes(path:str) -> int:
+    """Returns the bytes of a record file, or of all the files of a directory store"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, filename))
+                   for root, _, filenames in os.walk(path) for filename in filenames)
+    return os.path.getsize(path)
+
+def _result_rows(path:str, result, error:str, seconds:float) -> list:
+    """Rows of the table of run_batch for the result of a record"""
+    meta = {"path": path, "error": error, "seconds": seconds}
+    if result is None:
+        return [meta]
+    elif isinstance(result, pd.DataFrame):
+        return [dict(row, **meta) for row in result.to_dict("records")] if len(result) else [meta]
+    elif isinstance(result, dict):
+        return [dict(result, **meta)]
+    return [dict(result=result, **meta)]
+
+def run_batch(paths:list, func, n_workers:int=None, max_bytes:int=None, mem_per_record=None, lazy:bool=True,
+              import_kwargs:dict=None, func_kwargs:dict=None, verbose:bool=False) -> pd.DataFrame:
+    """Run func on the RecordMaster of each path in a pool of processes, and gather the results in a table.
+    Each record is imported in its worker (lazily by default), so only the paths and the results are sent
+    between the processes. A failure on a record does not stop the others, and is reported in its "error"
+    column with the traceback. A worker killed (e.g. out of memory) fails the records running at that time, and
+    the pool is restarted for the remaining records.
+
+    func must be picklable (defined at the top level of a module), and its result can be a dict (a row of the
+    table), a DataFrame (rows of the table) or any other picklable object (the "result" column).
+
+    params:
+        - paths: Paths of the record_master.h5 files (or directory stores, see export_record_dir)
+        - func: Analysis called as func(record_master, **func_kwargs)
+        - n_workers: Number of processes. Defaults to the number of cores
+        - max_bytes: Memory budget of the records processed at the same time. A record is only started when the
+        sum of the estimated memory of the running records stays under max_bytes (a record is always started
+        when none is running).
+        - mem_per_record: Estimated memory needed for a record, in bytes, or function returning it from the path.
+        Defaults to the size of the file (or of the files of a directory store).
+        - lazy: Import the records with lazy=True (see import_record)
+        - import_kwargs: Other parameters of import_record, e.g. names or groups to import
+        - func_kwargs: Keywords parameters of func
+        - verbose: Print the output of import_record in the workers
+
+    return:
+        - pandas DataFrame of the results, with the "path", "error" and "seconds" of each record, in the
+        order of paths
+    """
+    if len(paths) == 0:
+        return pd.DataFrame(columns=["path", "error", "seconds"])
+    import_kwargs = {} if import_kwargs is None else import_kwargs
+    func_kwargs   = {} if func_kwargs is None else func_kwargs
+    if mem_per_record is None:
+        mem_per_record = _record_nbytes
+    estimates = [mem_per_record(path) if callable(mem_per_record) else mem_per_record for path in paths]
+
+    rows    = [None] * len(paths)
+    pending = list(range(len(paths)))
+    running = {} #future -> index of its path
+    executor  = ProcessPoolExecutor(n_workers)
+    n_workers = executor._max_workers
+    try:
+        while pending or running:
+            broken        = False
+            running_bytes = sum(estimates[i] for i in running.values())
+            while pending and len(running) < n_workers and (max_bytes is None or len(running) == 0
+                                                              or running_bytes + estimates[pending[0]] <= max_bytes):
+                try:
+                    future = executor.submit(_run_record, paths[pending[0]], func, lazy, import_kwargs, func_kwargs,
+                                             verbose)
+                except BrokenProcessPool: #A worker died since the last results
+                    broken = True
+                    break
+                i = pending.pop(0)
+                running[future] = i
+                running_bytes  += estimates[i]
+            done = wait(running.keys(), return_when=FIRST_COMPLETED)[0] if running else set()
+            for future in done:
+                i = running.pop(future)
+                try:
+                    rows[i] = _result_rows(paths[i], *future.result())
+                except Exception: #Result not picklable, or worker killed (the records running then fail too)
+                    broken  = broken or isinstance(future.exception(), BrokenProcessPool)
+                    rows[i] = _result_rows(paths[i], None, traceback.format_exc(), np.nan)
+            if broken: #A killed worker breaks the pool, which is replaced for the remaining records
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(n_workers)
+    finally:
+        executor.shutdown()
+    table   = pd.DataFrame([row for record_rows in rows for row in record_rows])
+    columns = ["path"] + [col for col in table.columns if col not in ["path", "error", "seconds"]] + ["error", "seconds"]
+    return table[columns]
+
+# Cell
+def _shared_memory_dir() -> str:
+    """Returns the directory of the shared memory files: /dev/shm when available (files held in RAM),
+    or else the temporary directory"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+class SharedDataChunk():
+    """Picklable handle of a DataChunk whose arrays were copied to files of shared_dir, to be attached
+    without copy by other processes. Keeps the idx, group, fill and attrs of the DataChunk, and
+    its kind (dense, sparse or run-length encoded)."""
+    def __init__(self, datachunk, shared_dir:str, prefix:str):
+        self.idx   = datachunk.idx
+        self.group = datachunk.group
+        self.fill  = datachunk.fill
+        self.attrs = dict(datachunk.attrs)
+        if isinstance(datachunk, SparseDataChunk):
+            self.kind = "sparse"
+            csr    = datachunk.tocsr()
+            arrays = {"data": csr.data, "indices": csr.indices, "indptr": csr.indptr}
+            self.shape = csr.shape
+        elif isinstance(datachunk, RLEDataChunk):
+            self.kind  = "rle"
+            arrays = {"frames": datachunk.frames, "repeats": datachunk.repeats}
+        else:
+            self.kind  = "dense"
+            arrays = {"data": datachunk}
+        self._files = {key: self._write(array, os.path.join(shared_dir, "%s_%s.bin" % (prefix, key)))
+                       for key, array in arrays.items()}
+
+    @staticmethod
+    def _write(array, filename:str) -> tuple:
+        """Copy an array-like (DataChunk, LazyDataChunk, h5py Dataset...) by blocks to a file, and returns
+        its filename, dtype and shape"""
+        shape, dtype = tuple(array.shape), np.dtype(array.dtype)
+        if int(np.prod(shape)) == 0:
+            return None, dtype.str, shape
+        memmap = np.memmap(filename, mode="w+", dtype=dtype, shape=shape)
+        step   = max(1, (1<<24) // max(1, int(np.prod(shape[1:])) * dtype.itemsize))
+        for start in range(0, shape[0], step):
+            memmap[start:start+step] = array[start:start+step]
+        memmap.flush()
+        return filename, dtype.str, shape
+
+    def _attach_array(self, key:str, writable:bool):
+        filename, dtype, shape = self._files[key]
+        if filename is None:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(filename, mode="r+" if writable else "r", dtype=dtype, shape=shape)
+
+    def attach(self, writable:bool=False):
+        """Returns the DataChunk (or SparseDataChunk, RLEDataChunk) backed by the shared files. Modifications
+        of a writable DataChunk are seen by all the processes."""
+        if self.kind == "sparse":
+            csr = sparse.csr_matrix(tuple(self._attach_array(key, writable) for key in ["data", "indices", "indptr"]),
+                                    shape=self.shape, copy=False)
+            datachunk = SparseDataChunk(csr, self.idx, self.group)
+        elif self.kind == "rle":
+            datachunk = RLEDataChunk(self._attach_array("frames", writable), self._attach_array("repeats", False),
+                                     self.idx, self.group, self.fill)
+        else:
+            datachunk = DataChunk(self._attach_array("data", writable), self.idx, self.group, self.fill)
+        datachunk.attrs = dict(self.attrs)
+        return datachunk
+
+    def __repr__(self):
+        return "SharedDataChunk(%s,%s,%s,%s)"%(self.kind, self.idx, self.group, self.fill)
+
+_ATTACHED_RECORDS = {} #(shared_dir, writable) -> RecordMaster attached in this process
+
+class SharedRecord():
+    """Copy of the DataChunk of a RecordMaster in shared memory files, that is pickled as a light handle and
+    attached without copy in worker processes. The shared files are removed by close() (or at the end of a with
+    statement) in the process that created them.
+
+    Usage:
+        def fit_cell(shared_record, cell_idx):
+            record_master = shared_record.attach()
+            ...
+
+        with SharedRecord(reM, names=["checkerboard", "S_matrix"]) as shared_record:
+            with ProcessPoolExecutor() as executor:
+                fits = list(executor.map(fit_cell, [shared_record]*n_cell, range(n_cell)))
+
+    params:
+        - record_master: The RecordMaster to share
+        - names: Name, or list of names of the data to share. None to share all names. "main_tp" and "signals"
+        are always shared.
+        - shared_dir: Directory in which the shared files are created. Defaults to /dev/shm when available
+    """
+    def __init__(self, record_master:RecordMaster, names=None, shared_dir:str=None):
+        if isinstance(names, str):
+            names = [names]
+        self.shared_dir = tempfile.mkdtemp(prefix="theonerig_shared_",
+                                           dir=_shared_memory_dir() if shared_dir is None else shared_dir)
+        self._owner_pid = os.getpid()
+        self.sequences  = [] #(length, frame_rate, {name: [SharedDataChunk]}) of each sequence
+        try:
+            for i, seq in enumerate(record_master):
+                shared_dict = {}
+                for name in seq.keys():
+                    if names is not None and name not in names + [seq.MAIN_TP, seq.SIGNALS]:
+                        continue
+                    shared_dict[name] = [SharedDataChunk(datachunk, self.shared_dir, "%d_%d_%d" % (i, len(shared_dict), j))
+                                         for j, datachunk in enumerate(seq._data_dict[name])]
+                self.sequences.append((seq.length, 1/seq._frame_time, shared_dict))
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the shared files"""
+        return sum(os.path.getsize(os.path.join(self.shared_dir, filename)) for filename in os.listdir(self.shared_dir))
+
+    def attach(self, writable:bool=False) -> RecordMaster:
+        """Returns a RecordMaster whose DataChunk are backed by the shared files. The RecordMaster is attached once
+        per process and reused by the next calls. With writable=True, the in-place modifications of the data are
+        seen by all the processes."""
+        key = (self.shared_dir, writable)
+        if key not in _ATTACHED_RECORDS:
+            record_master = RecordMaster([(shared_dict[ContiguousRecord.MAIN_TP][0].attach(writable),
+                                           shared_dict[ContiguousRecord.SIGNALS][0].attach(writable))
+                                          for length, frame_rate, shared_dict in self.sequences],
+                                         frame_rate=[frame_rate for _, frame_rate, _ in self.sequences])
+            for seq, (length, frame_rate, shared_dict) in zip(record_master, self.sequences):
+                for name, shared_dcs in shared_dict.items():
+                    if name in [seq.MAIN_TP, seq.SIGNALS]:
+                        continue
+                    for shared_dc in shared_dcs:
+                        seq[name] = shared_dc.attach(writable)
+                seq.mark_clean()
+            _ATTACHED_RECORDS[key] = record_master
+        return _ATTACHED_RECORDS[key]
+
+    def close(self):
+        """Remove the shared files, when called from the process that created them"""
+        for key in [(self.shared_dir, False), (self.shared_dir, True)]:
+            _ATTACHED_RECORDS.pop(key, None)
+        if os.getpid() == self._owner_pid:
+            shutil.rmtree(self.shared_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "SharedRecord(%s, %d sequences)" % (self.shared_dir, len(self.sequences))
\ No newline at end of file
@@ -778,12 +778,13 @@ def plot_spike_amplitudes_kilo(reM, cluster, spike_templates, spike_clusters, sp
         idx_l.append(dc.idx)
     idx_l = np.array(idx_l)
     order_stim = np.argsort(idx_l)
+    main_tp = seq["main_tp"]
     for stim_idx in order_stim:
         stim_name = stim_names[stim_idx]
         text = stim_names_to_print[stim_idx]
         dc = seq._data_dict[stim_name][0]
-        len_dc = seq["main_tp"][dc.idx+len(dc)]-seq["main_tp"][dc.idx]
-        start_dc = seq["main_tp"][dc.idx]
+        len_dc = main_tp[dc.idx+len(dc)]-main_tp[dc.idx]
+        start_dc = main_tp[dc.idx]
         ax.barh(ymin, len_dc, left=start_dc, height=(ymax-ymin)/6, color = "gray")
         ax.text(start_dc+ 5000, ymin+(ymax-ymin)/32, text, fontdict={"size":10}, color = "white", weight = "bold")
 
@@ -197,7 +197,8 @@ def process_sta_batch(stim_inten, spike_counts, Hw=30, Fw=2, return_pval=False,
 
     params:
         - stim_inten: stimulus intensity matrix of shape (t, ...)
-        - spike_counts: cells activity matrix of shape (t, n_cell)
+        - spike_counts: cells activity matrix of shape (t, n_cell). Can be a scipy.sparse matrix or a SparseDataChunk,
+        in which case it is never densified.
         - Hw: Lenght in frames of the history window, including the 0 timepoint
         - Fw: Lenght in frames of the forward window
         - return_pval: Flag to signal whether or not to return the pvalues
@@ -208,10 +209,12 @@ def process_sta_batch(stim_inten, spike_counts, Hw=30, Fw=2, return_pval=False,
         - stas and pvalues if return_pval=True, both of shape (n_cell, Hw+Fw, ...)
     """
     assert normalisation in ["abs", "L2", None], "normalisation must be one of ['abs', 'L2', None]"
+    if isinstance(spike_counts, SparseDataChunk):
+        spike_counts = spike_counts.tocsr()
     #Preparing the stimulus
     orig_shape = stim_inten.shape
     stim_inten = stim_inten_norm(stim_inten)
-    sum_spikes = np.sum(spike_counts, axis=0)
+    sum_spikes = np.asarray(spike_counts.sum(axis=0)).ravel()
     len_stim = len(stim_inten)
 
     #We just have to calculate one STA over the whole record
@@ -264,6 +267,8 @@ def staEst_fromBins(stim, spike_counts, Hw, Fw=0):
     return:
         - STA of shape (n_cell, Hw+Fw, flattened_frame)
     """
+    if sp.sparse.issparse(spike_counts):
+        return _staEst_fromBins_sparse(stim, spike_counts, Hw, Fw=Fw)
     spike_counts[:Hw] = 0
 
     spike_counts = np.nan_to_num(spike_counts / np.sum(spike_counts,axis=0))
@@ -281,6 +286,32 @@ def staEst_fromBins(stim, spike_counts, Hw, Fw=0):
     spike_counts = np.roll(spike_counts, -Fw, axis=0)
     return np.transpose(sta, (2,0,1))
 
+def _staEst_fromBins_sparse(stim, spike_counts, Hw, Fw=0):
+    """
+    staEst_fromBins for scipy.sparse spike_counts, computed without densifying them. The centering of
+    the spike counts is applied to the products with the stimulus instead.
+    """
+    n_t = spike_counts.shape[0]
+    time_mask = np.ones(n_t)
+    time_mask[:Hw] = 0
+    spike_counts = sp.sparse.diags(time_mask) @ sp.sparse.csr_matrix(spike_counts, dtype=float)
+    sum_spikes   = np.asarray(spike_counts.sum(axis=0)).ravel()
+    spike_counts = spike_counts @ sp.sparse.diags(np.divide(1, sum_spikes, out=np.zeros(len(sum_spikes)), where=sum_spikes!=0))
+    mean_counts  = np.asarray(spike_counts.mean(axis=0)).ravel()
+    sta = np.zeros((Hw+Fw, stim.shape[0], spike_counts.shape[-1]))
+    for i in range(Hw): #Same as np.roll(spike_counts, -i, axis=0), with the mean subtracted from the product
+        rolled = spike_counts[(np.arange(n_t)+i) % n_t]
+        sta[(Hw-1-i),:,:] = (rolled.T @ stim.T).T - np.outer(np.sum(stim, axis=1), mean_counts)
+    if Fw != 0:
+        time_mask = np.ones(n_t)
+        time_mask[-Fw:] = 0
+        spike_counts = sp.sparse.diags(time_mask) @ spike_counts
+    for i in range(Fw):
+        roll_idx = (np.arange(n_t)-(i+1)) % n_t
+        rolled   = spike_counts[roll_idx]
+        sta[Hw+i,:,:] = (rolled.T @ stim.T).T - np.outer(stim @ time_mask[roll_idx], mean_counts)
+    return np.transpose(sta, (2,0,1))
+
 def process_sta_batch_large(stim_inten, spike_counts, Hw=30, Fw=2, return_pval=False, normalisation="abs", bs=1000):
     """
     Computes the STA and associated pvalues in parallel for a batch of cells, for a large stimulus.
@@ -298,10 +329,12 @@ def process_sta_batch_large(stim_inten, spike_counts, Hw=30, Fw=2, return_pval=F
         - stas of shape (n_cell, Hw+Fw, ...)
         - stas and pvalues if return_pval=True, both of shape (n_cell, Hw+Fw, ...)
     """
+    if isinstance(spike_counts, SparseDataChunk):
+        spike_counts = spike_counts.tocsr()
     orig_shape = stim_inten.shape
     n_spatial_dim = orig_shape[1]*orig_shape[2]
 
-    sum_spikes = np.sum(spike_counts, axis=0)
+    sum_spikes = np.asarray(spike_counts.sum(axis=0)).ravel()
     len_stim = len(stim_inten)
     allCells_sta = np.zeros((n_spatial_dim, spike_counts.shape[1], Hw+Fw))
     stim_inten = stim_inten.reshape((len_stim,-1))
@@ -11,6 +11,7 @@ import csv
 import re
 
 from .io import *
+from ..core import *
 from ..utils import *
 
 def get_QDSpy_logs(log_dir):
@@ -181,11 +182,14 @@ def get_synced_file(stim_list_dir, stim_id):
     return stim, stim_path
 
 # Cell
-def unpack_stim_npy(npy_dir, md5_hash):
+def unpack_stim_npy(npy_dir, md5_hash, rle=False):
     """Find the stimuli of a given hash key in the npy stimulus folder. The stimuli are in a compressed version
     comprising three files. inten for the stimulus values on the screen, marker for the values of the marker
     read by a photodiode to get the stimulus timing during a record, and an optional shader that is used to
-    specify informations about a shader when used, like for the moving gratings."""
+    specify informations about a shader when used, like for the moving gratings.
+
+    If rle is True, the stimuli are not unpacked but returned as RLEDataChunk of the "stim" group, that
+    expand only the windows read. Their idx is 0 and needs to be set to the stimulus start in the record."""
 
     #Stimuli can be either npy or npz (useful when working remotely)
     def find_file(ftype):
@@ -205,6 +209,11 @@ def unpack_stim_npy(npy_dir, md5_hash):
         shader        = find_file("shader")
         unpack_shader = np.empty((np.sum(marker[:,0]), *shader.shape[1:]))
 
+    if rle:
+        repeats = marker[:,0].astype(int)
+        return (RLEDataChunk(inten, repeats, 0, "stim"), RLEDataChunk(marker[:,1], repeats, 0, "stim"),
+                None if shader is None else RLEDataChunk(shader, repeats, 0, "stim"))
+
     #The latter unpacks the arrays
     unpack_inten  = np.empty((np.sum(marker[:,0]), *inten.shape[1:]))
     unpack_marker = np.empty(np.sum(marker[:,0]))
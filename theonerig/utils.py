@@ -18,6 +18,7 @@ import scipy.interpolate as interpolate
 from scipy.ndimage import convolve1d
 from scipy.signal import savgol_filter
 import scipy.stats
+import scipy.sparse
 from scipy.ndimage import gaussian_filter
 import matplotlib.pyplot as plt
 import math
@@ -131,7 +132,7 @@ def align_sync_timepoints(timepoints:DataChunk, signals:DataChunk,
 
 # Cell
 def resample_to_timepoints(timepoints:np.ndarray, data:np.ndarray,
-                             ref_timepoints:DataChunk, group="data") -> DataChunk:
+                             ref_timepoints:DataChunk, group="data", dtype=None) -> DataChunk:
     """
     Resample the data at timepoints to new timepoints given by ref_timepoints.
     Return a DataChunk of the resampled data belonging to a specified group.
@@ -141,6 +142,7 @@ def resample_to_timepoints(timepoints:np.ndarray, data:np.ndarray,
         - data: Data to resample of shape (t, ...)
         - ref_timepoints: Target timepoints for the resampling
         - group: Group assigned to the returned DataChunk
+        - dtype: dtype of the resampled data (e.g. np.float32 to save memory). None for float64
 
     return:
         - Resampled datachunk with appropriate idx.
@@ -150,14 +152,10 @@ def resample_to_timepoints(timepoints:np.ndarray, data:np.ndarray,
     timepoints = np.array(timepoints)
     data = np.array(data)
 
-    start_idx = np.argmax(ref_timepoints >= timepoints[0])
-    stop_idx  = np.argmax(ref_timepoints >= timepoints[-1])
-    if stop_idx == 0:
-        stop_idx = len(ref_timepoints)
+    start_idx, stop_idx = np.searchsorted(ref_timepoints, [timepoints[0], timepoints[-1]], side="left")
 
     if len(ref_timepoints[start_idx:stop_idx]) < len(timepoints): #Downsampling
-        distance = (np.argmax(timepoints>ref_timepoints[start_idx+1])
-                - np.argmax(timepoints>ref_timepoints[start_idx]))
+        distance = np.diff(np.searchsorted(timepoints, ref_timepoints[start_idx:start_idx+2], side="right"))[0]
 
         kernel = np.ones(distance)/distance
         data = convolve1d(data, kernel, axis=0) #Smooting to avoid weird sampling
@@ -165,6 +163,8 @@ def resample_to_timepoints(timepoints:np.ndarray, data:np.ndarray,
     new_data = interpolate.interp1d(timepoints, data, axis=0)(ref_timepoints[start_idx:stop_idx])
 
     idx = ref_timepoints.idx + start_idx
+    if dtype is not None:
+        new_data = new_data.astype(dtype)
     return DataChunk(data=new_data, idx = idx, group=group)
 
 # Cell
@@ -278,13 +278,15 @@ def phy_results_dict(phy_dir):
 
     return res_dict
 
-def spike_to_dataChunk(spike_timepoints, ref_timepoints:DataChunk) -> DataChunk:
+def spike_to_dataChunk(spike_timepoints, ref_timepoints:DataChunk, sparse=False, dtype=np.float64) -> DataChunk:
     """
     Factory function of a DataChunk for spiking count of cells from spike timepoints.
 
     params:
         - spike_timepoints: Dictionnary of the cells spike timepoints (list)
         - ref_timepoints: Reference DataChunk to align the newly created spike count Datachunk
+        - sparse: If True, returns a SparseDataChunk, without building the dense matrix
+        - dtype: dtype of the spike counts (e.g. np.uint16 to save memory)
 
     return:
         - Spike count datachunk of shape (t, n_cell)
@@ -293,9 +295,24 @@ def spike_to_dataChunk(spike_timepoints, ref_timepoints:DataChunk) -> DataChunk:
     cell_keys = sorted(map(int,
                                     spike_timepoints.keys()))
     cell_map = dict([ (cell_key, i) for i, cell_key in enumerate(cell_keys) ])
-    spike_bins = np.zeros((ref_timepoints.shape[0], len(cell_keys)))
     bins = np.concatenate((ref_timepoints[:], [(ref_timepoints[-1]*2)-ref_timepoints[-2]]))
 
+    if sparse:
+        rows, cols = [], []
+        for i, cell in enumerate(cell_keys):
+            spikes  = np.asarray(spike_timepoints[type_cast(cell)])
+            spikes  = spikes[(spikes >= bins[0]) & (spikes <= bins[-1])]
+            bin_idx = np.minimum(np.searchsorted(bins, spikes, side="right")-1, len(bins)-2) #Same bins as np.histogram
+            rows.append(bin_idx)
+            cols.append(np.full(len(bin_idx), i))
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        spike_bins = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, cols)),
+                                             shape=(len(bins)-1, len(cell_keys)))
+        datachunk  = SparseDataChunk(spike_bins, idx=ref_timepoints.idx, group="cell")
+        datachunk.attrs["cell_map"] = cell_map
+        return datachunk
+
+    spike_bins = np.zeros((ref_timepoints.shape[0], len(cell_keys)), dtype=dtype)
     for i, cell in enumerate(cell_keys):
         spike_bins[:, i] = np.histogram(spike_timepoints[type_cast(cell)], bins)[0]
 
@@ -342,8 +359,8 @@ def twoP_dataChunks(ref_timepoints:DataChunk, frame_timepoints, len_epochs, *arg
         len_epochs = [len_epochs]
     # For every recording block (defined by len_epochs),
     for i, len_epoch in enumerate(len_epochs):
-        start_idx = np.argmax(ref_timepoints>frame_timepoints[i][0])
-        stop_idx  = np.argmax(ref_timepoints>frame_timepoints[i][len_epoch-1])
+        start_idx, stop_idx = np.searchsorted(ref_timepoints, [frame_timepoints[i][0], frame_timepoints[i][len_epoch-1]],
+                                              side="right")
         for k, matrix in enumerate(args):
             sub_mat = matrix.T[cursor:cursor+len_epoch]
 